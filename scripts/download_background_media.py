@@ -1,40 +1,45 @@
 # -*- coding: utf-8 -*-
 
-import json
 from typing import List
 
-from tqdm import tqdm
+from tqdm.contrib.concurrent import thread_map
 
 from src.config import settings
-from src.schemas import MediaFile
+from src.schemas import MediaFile, load_media_files
 
 # NOTE:
 # This is useful if you want to download all the background media files in a single go and avoid
 # downloading them one by one during the reels creation.
 
 
-def download_media_files(files: List[str], file_type: str) -> None:
+def download_media_files(
+    files: List[MediaFile],
+    file_type: str,
+    max_workers: int = 8,
+) -> None:
     """
-    Download multiple files using `download_media_file` with a progress bar.
+    Download multiple files concurrently using `MediaFile.download` with a progress bar.
 
     Args:
-        files (List[str]): List of file paths to download.
+        files (List[MediaFile]): List of media files to download.
         file_type (str): Type of files (e.g., "Audio", "Video") for the tqdm description.
+        max_workers (int): Maximum number of downloads at the same time.
     """
-    for file in tqdm(files, desc=f"Downloading {file_type}", unit="file"):
-        file.download()
+    thread_map(
+        MediaFile.download,
+        files,
+        max_workers=max_workers,
+        desc=f"Downloading {file_type}",
+        unit="file",
+    )
 
 
 if __name__ == "__main__":
 
     print("Loading JSON data...")
     # Load and process background audios and videos
-    audios = [
-        MediaFile(**audio) for audio in json.load(open(settings.BACKGROUND_AUDIOS_JSON))
-    ]
-    videos = [
-        MediaFile(**video) for video in json.load(open(settings.BACKGROUND_VIDEOS_JSON))
-    ]
+    audios = list(load_media_files(settings.BACKGROUND_AUDIOS_JSON))
+    videos = list(load_media_files(settings.BACKGROUND_VIDEOS_JSON))
 
     print(f"Downloading all background audio files({len(audios)})...")
     download_media_files(audios, "Audio")
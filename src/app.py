@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import asyncio
-import json
 import random
 import re
 import subprocess
@@ -12,7 +11,7 @@ import streamlit as st
 from src.config import settings
 from src.pipelines.stt import get_speech_to_text
 from src.pipelines.tts import get_text_to_speech
-from src.schemas import MediaFile, Speaker
+from src.schemas import Speaker, load_languages, load_media_files
 from src.utils.media.audio import concatenate_audio_files, cut_audio, get_audio_duration
 from src.utils.media.video import (
     add_captions,
@@ -20,12 +19,12 @@ from src.utils.media.video import (
     create_image_videoclip,
     cut_video,
     extract_video_thumbnail,
-    get_video_duration,
+    get_video_durations,
     overlay_videos,
     resize_video,
 )
 from src.utils.reddit.post import get_reddit_object
-from src.utils.reddit.screenshot import take_comment_screenshot, take_post_screenshot
+from src.utils.reddit.screenshot import take_screenshots
 
 # Initialize session state
 if "selected_video" not in st.session_state:
@@ -199,7 +198,7 @@ if post is not None:
         progress_bar = st.progress(0, text=progress_text)
 
         data = []
-        for i, comment in enumerate(post.comments[:comments_to_show]):
+        for comment in post.comments[:comments_to_show]:
             if (
                 comment.length <= max_comment_length
                 and comment.body != "[removed]"
@@ -218,16 +217,20 @@ if post is not None:
                     },
                 )
 
-                tts.generate_audio_clip(
-                    comment.body,
-                    speaker=speaker.name,
-                    language=post.language,
-                    output_path=comment.audio_path,
-                    speed=AUDIO_SPEED,
-                )
+        # Generate the audio clips concurrently, in batches to update the progress bar
+        batch_size = 8
+        for i in range(0, len(data), batch_size):
+            batch = data[i : i + batch_size]  # noqa: E203
+            tts.generate_audio_clips(
+                [row["body"] for row in batch],
+                output_paths=[row["audio_path"] for row in batch],
+                speaker=speaker,
+                speed=AUDIO_SPEED,
+                max_concurrency=batch_size,
+            )
 
             # Update progress bar
-            progress = (i + 1) / comments_to_show
+            progress = min(i + batch_size, len(data)) / len(data)
             progress_bar.progress(progress, text=progress_text)
 
         # Convert the data to a DataFrame
@@ -313,9 +316,16 @@ if post is not None and st.session_state.continue_to_reddit_videos:
     st.header("3 - Create reddit post videos")
 
     try:
-        with st.spinner("(1/2) Logging in and taking post screenshot..."):
-            # Take post screenshot and mount post video
-            asyncio.run(take_post_screenshot(post, THEME))
+        comments_to_process = [
+            comment
+            for comment in post.comments
+            if comment.comment_id
+            in st.session_state.selected_comments["comment_id"].to_list()
+        ]
+
+        with st.spinner("(1/2) Logging in and taking post and comments screenshots..."):
+            # Take all the screenshots in a single browser session
+            asyncio.run(take_screenshots(post, comments_to_process, theme=THEME))
 
         with st.spinner("(2/2) Generating post videocplip..."):
             # Generate post video: combine audio and image
@@ -325,22 +335,11 @@ if post is not None and st.session_state.continue_to_reddit_videos:
                 output_path=post.video_path,
             )
 
-        # Take comment screenshot and mount comments videos
+        # Mount comments videos
         comments_progress_bar = st.progress(0, text="Generating comments videoclips...")
-        comments_to_process = [
-            comment
-            for comment in post.comments
-            if comment.comment_id
-            in st.session_state.selected_comments["comment_id"].to_list()
-        ]
         for i, comment in enumerate(comments_to_process):
             with st.spinner(
-                f"(1/2) Taking screenshot of comment `{comment.comment_id}`...",
-            ):
-                asyncio.run(take_comment_screenshot(comment, THEME))
-
-            with st.spinner(
-                f"(2/2) Generating comment `{comment.comment_id}` videocplip...",
+                f"Generating comment `{comment.comment_id}` videocplip...",
             ):
                 # Generate comment video: combine audio and image
                 create_image_videoclip(
@@ -358,14 +357,10 @@ if post is not None and st.session_state.continue_to_reddit_videos:
 
         with st.spinner(f"Generating outro videocplip in {post.language} language..."):
             # Generate outro clip
-            outro = [
-                lang["outro"]
-                for lang in json.load(open("./data/languages.json"))
-                if lang["lang_code"] == post.language
-            ]
+            outro_text = load_languages()[post.language]["outro"]
 
             tts.generate_audio_clip(
-                text=outro[0],
+                text=outro_text,
                 language=post.language,
                 output_path=f"./assets/others/outros/outro_{post.language}_{speaker.id}.mp3",
                 speaker=speaker.name,
@@ -427,13 +422,8 @@ if (
 
     st.write("Select a background video and audio.")
 
-    background_audios = [
-        MediaFile(**audio) for audio in json.load(open(settings.BACKGROUND_AUDIOS_JSON))
-    ]
-
-    background_videos = [
-        MediaFile(**video) for video in json.load(open(settings.BACKGROUND_VIDEOS_JSON))
-    ]
+    background_audios = list(load_media_files(settings.BACKGROUND_AUDIOS_JSON))
+    background_videos = list(load_media_files(settings.BACKGROUND_VIDEOS_JSON))
 
     # Set media select options
     background_select_options = ["Random", "Manual"]
@@ -486,7 +476,7 @@ if (
     and st.session_state.selected_audio
 ):
 
-    background_duration = sum(get_video_duration(video) for video in reddit_videos)
+    background_duration = sum(get_video_durations(reddit_videos))
 
     try:
         with st.spinner("(1/3) Cutting and resizing the background..."):
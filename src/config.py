@@ -1,27 +1,10 @@
 # -*- coding: utf-8 -*-
-import subprocess
-from typing import Literal
+import os
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings
 
 
-def is_videotoolbox_available() -> bool:
-    """
-    Check if h264_videotoolbox is available on the system. In other words check if
-    the you have a GPU that supports hardware acceleration.
-    """
-    try:
-        result = subprocess.run(
-            ["ffmpeg", "-hide_banner", "-encoders"],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        return "h264_videotoolbox" in result.stdout
-    except Exception:
-        return False
-
-
 class Settings(BaseSettings):
     """
     This class defines the settings for the application. The settings are
@@ -37,10 +20,18 @@ class Settings(BaseSettings):
     - REDDIT_CLIENT_SECRET: The client secret of the Reddit application.
     - REDDIT_USER_NAME: The username of the Reddit user.
     - REDDIT_USER_PASSWORD: The password of the Reddit user.
+    - REDDIT_STATE_PATH: The path where the logged in Reddit session is saved. It holds the
+        session cookies, so it must never be committed.
     - SCREEN_HEIGHT: The height of the screen in pixels.
     - SCREEN_WIDTH: The width of the screen in pixels.
-    - USE_GPU: Whether to use GPU for video processing.
+    - USE_GPU: Whether to use a hardware H.264 encoder (NVENC or VideoToolbox) if available.
+    - USE_GPU_DECODE: Whether to also decode and scale videos on the GPU of the hardware
+        encoder. Off by default, since the GPU cannot decode every codec and pixel format.
     - PRESET: The preset for the video processing.
+    - FFMPEG_THREADS: The number of threads of each ffmpeg encode.
+    - FFMPEG_MAX_JOBS: The maximum number of ffmpeg jobs running at the same time.
+    - USE_PYAV: Whether to cut videos without re-encoding in-process with PyAV instead of
+        spawning ffmpeg. Requires the pyav extra (PyAV 14 or newer): `uv sync --extra pyav`.
     - PYTHONWARNINGS: The warnings to be ignored.
     - TOKENIZERS_PARALLELISM: The parallelism of the tokenizers.
     - TEMP_PATH: The temporary path for storing files.
@@ -49,6 +40,12 @@ class Settings(BaseSettings):
     - BACKGROUND_AUDIOS_JSON: The path to the JSON file containing the background audios.
     - PROCESSED_VIDEOS_CSV: The path to the CSV containing the processed videos information.
     - FORCE_HF_CPU: Whether to force the use of CPU for Hugging Face models.
+    - CAPTIONS_CACHE_PATH: The path for caching the aligned captions.
+    - TTS_CACHE_PATH: The path for caching the generated speech by text and speaker.
+    - PROBE_CACHE_PATH: The path for caching the ffprobe metadata of the media files.
+    - WHISPER_COMPUTE_TYPE: The CTranslate2 compute type to run Whisper with faster-whisper
+        (e.g. int8_float16). If not set, the PyTorch Whisper model is used. Requires the
+        faster-whisper extra: `uv sync --extra faster-whisper`.
     """
 
     # Credentials
@@ -62,6 +59,7 @@ class Settings(BaseSettings):
     REDDIT_CLIENT_SECRET: str
     REDDIT_USER_NAME: str
     REDDIT_USER_PASSWORD: str
+    REDDIT_STATE_PATH: str = ".temp/reddit-state.json"
 
     # Background files
     BACKGROUND_VIDEOS_JSON: str = "data/videos.json"
@@ -75,8 +73,12 @@ class Settings(BaseSettings):
     SCREEN_WIDTH: int = 1080
 
     # Video processing
-    USE_GPU: bool = is_videotoolbox_available()
+    USE_GPU: bool = True
+    USE_GPU_DECODE: bool = False
     PRESET: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = "slow"
+    FFMPEG_THREADS: int = 4
+    FFMPEG_MAX_JOBS: int = max(1, (os.cpu_count() or 1) // 4)
+    USE_PYAV: bool = False
 
     # Others
     PYTHONWARNINGS: str = "ignore"
@@ -84,6 +86,10 @@ class Settings(BaseSettings):
     TEMP_PATH: str = ".temp"
     REDDIT_PATTERN: str = r"^https://www\.reddit\.com/.*"
     FORCE_HF_CPU: bool = False
+    CAPTIONS_CACHE_PATH: str = "assets/cache/captions"
+    TTS_CACHE_PATH: str = "assets/cache/tts"
+    PROBE_CACHE_PATH: str = "assets/cache/probe"
+    WHISPER_COMPUTE_TYPE: Optional[str] = None
 
     class Config:
         env_file = ".env"
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from typing import List, Literal, Tuple, Union
+from typing import Any, ClassVar, Dict, List, Literal, Optional, Tuple, Union
 
 import faiss
 import numpy as np
@@ -15,11 +15,27 @@ from src.utils.common import get_device
 torch.set_num_threads(1)
 
 
+def get_model_kwargs(device: str) -> Dict[str, Any]:
+    """
+    Get the kwargs to load the Hugging Face models of a device. On CUDA the weights are
+    loaded in half precision, which halves their memory and runs on the Tensor Cores.
+
+    Args:
+        device: Device where the model will run.
+    """
+    if device == "cuda":
+        return {"torch_dtype": torch.float16}
+    return {}
+
+
 class Embeddings:
     """
     Embeddings class using Sentence Transformers.
     """
 
+    # Loaded models shared across instances, by model name
+    _models: ClassVar[Dict[str, SentenceTransformer]] = {}
+
     def __init__(self, model_name: str):
         """
         Initialize the sentence transformer model.
@@ -30,18 +46,21 @@ class Embeddings:
         """
 
         self.model_name = model_name
-        self._model = None  # Defer loading until first use
-        self._device = None  # Defer loading until first use
-
-        @property
-        def device(self):
-            return get_device()
 
-        @property
-        def model(self):
-            if self._model is None:
-                self._model = SentenceTransformer(model_name, device=self.device)
-            return self._model
+    @property
+    def device(self):
+        return get_device()
+
+    @property
+    def model(self):
+        # Defer loading until first use, and load each model once per process
+        if self.model_name not in self._models:
+            self._models[self.model_name] = SentenceTransformer(
+                self.model_name,
+                device=self.device,
+                model_kwargs=get_model_kwargs(self.device),
+            )
+        return self._models[self.model_name]
 
     def encode(self, text: Union[str, List[str]]) -> np.ndarray:
         """
@@ -50,7 +69,8 @@ class Embeddings:
         Args:
             text: Input text or list of texts to encode
         """
-        return self.model.encode(text)
+        with torch.inference_mode():
+            return self.model.encode(text)
 
 
 class ReRanker:
@@ -58,6 +78,9 @@ class ReRanker:
     Cross-encoder re-ranker for improved relevance
     """
 
+    # Loaded models shared across instances, by model name
+    _models: ClassVar[Dict[str, CrossEncoder]] = {}
+
     def __init__(self, model_name: str):
         """
         Args:
@@ -65,22 +88,21 @@ class ReRanker:
             See: https://huggingface.co/cross-encoder
         """
         self.model_name = model_name
-        self._model = None  # Defer loading until first use
-        self._device = None  # Defer loading until first use
-
-        @property
-        def device(self):
-            return get_device()
-
-        @property
-        def model(self):
-            if self._model is None:
-                self._model = CrossEncoder(
-                    model_name,
-                    device=self.device,
-                    compute_type="float16",
-                )
-            return self._model
+
+    @property
+    def device(self):
+        return get_device()
+
+    @property
+    def model(self):
+        # Defer loading until first use, and load each model once per process
+        if self.model_name not in self._models:
+            self._models[self.model_name] = CrossEncoder(
+                self.model_name,
+                device=self.device,
+                model_kwargs=get_model_kwargs(self.device),
+            )
+        return self._models[self.model_name]
 
     def rerank(
         self,
@@ -100,7 +122,8 @@ class ReRanker:
         pairs = [[query, doc] for doc in documents]
 
         # Get scores from cross-encoder
-        scores = self.model.predict(pairs)
+        with torch.inference_mode():
+            scores = self.model.predict(pairs)
 
         # Combine documents with scores and sort
         scored_docs = list(zip(documents, scores))
@@ -126,9 +149,10 @@ class VectorStore:
         self.documents = []
         self.bm25 = None
 
-    def add_documents(self, documents: List[str]):
+    def add_documents(self, documents: List[str]) -> np.ndarray:
         """
-        Index documents for searching to the vector and BM25 index
+        Index documents for searching to the vector and BM25 index. Returns the normalized
+        embeddings of the documents, to reuse them as queries without encoding them again.
 
         Args:
             documents: List of documents to index
@@ -146,15 +170,24 @@ class VectorStore:
         tokenized_docs = [doc.split() for doc in documents]
         self.bm25 = BM25Okapi(tokenized_docs)
 
-    def semantic_search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        return embeddings
+
+    def semantic_search(
+        self,
+        query: str,
+        k: int = 5,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> List[Tuple[str, float]]:
         """
         Pure vector similarity search
 
         Args:
             query: Query string
             k: Number of results to return
+            query_embedding: Precomputed embedding of the query. If None, it is encoded.
         """
-        query_embedding = self.embeddings.encode(query)
+        if query_embedding is None:
+            query_embedding = self.embeddings.encode(query)
         query_embedding = normalize(query_embedding.reshape(1, -1), axis=1, norm="l2")
 
         scores, indices = self.index.search(query_embedding.astype(np.float32), k)
@@ -185,6 +218,7 @@ class VectorStore:
         query: str,
         k: int = 5,
         alpha: float = 0.5,
+        query_embedding: Optional[np.ndarray] = None,
     ) -> List[Tuple[str, float]]:
         """
         Combine BM25 and vector search scores
@@ -193,9 +227,10 @@ class VectorStore:
             query: Query string
             k: Number of results to return
             alpha: alpha: Weight for hybrid search (0=BM25, 1=vector)
+            query_embedding: Precomputed embedding of the query. If None, it is encoded.
         """
         # Vector search
-        vector_results = self.semantic_search(query, k)
+        vector_results = self.semantic_search(query, k, query_embedding=query_embedding)
         vector_scores = {doc: score for doc, score in vector_results}
 
         # BM25 search
@@ -222,6 +257,30 @@ class VectorStore:
         combined_scores.sort(key=lambda x: x[1], reverse=True)
         return combined_scores[:k]
 
+    def batch_hybrid_search(
+        self,
+        queries: List[str],
+        k: int = 5,
+        alpha: float = 0.5,
+        query_embeddings: Optional[np.ndarray] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Hybrid search for several queries, encoding all of them in a single batch
+
+        Args:
+            queries: Query strings
+            k: Number of results to return per query
+            alpha: Weight for hybrid search (0=BM25, 1=vector)
+            query_embeddings: Precomputed embeddings of the queries (e.g. the ones returned
+                by `add_documents`). If None, they are encoded.
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embeddings.encode(queries)
+        return [
+            self.hybrid_search(query, k=k, alpha=alpha, query_embedding=query_embedding)
+            for query, query_embedding in zip(queries, query_embeddings)
+        ]
+
     def search(
         self,
         query: str,
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import re
 from typing import List, Optional, Union
 
@@ -8,12 +9,9 @@ from loguru import logger
 from src.pipelines.schemas import RedditVideoPipeline
 from src.schemas import CaptionStyle, RedditPost, Speaker
 from src.utils.media.video import (
-    add_captions,
-    add_fade_out,
     create_image_videoclip,
-    extract_video_thumbnail,
     get_video_duration,
-    overlay_videos,
+    render_final_reel,
     shift_caption_start,
 )
 from src.utils.reddit.post import get_reddit_object
@@ -53,7 +51,6 @@ class RedditStoriesPipeline(RedditVideoPipeline):
         self.background_video_path = (
             "assets/posts/{post_id}/video/background_video_{suffix}.mp4"
         )
-        self.background_audio_path = "assets/posts/{post_id}/audio/background_audio.mp3"
 
     def generate_title_media(self, post: RedditPost) -> None:
         """
@@ -82,6 +79,7 @@ class RedditStoriesPipeline(RedditVideoPipeline):
         self,
         post: RedditPost,
         background_video: str,
+        background_audio: str,
         overlay_media: List[str],
         captions: CaptionStyle = None,
         video_text: str = None,
@@ -91,26 +89,22 @@ class RedditStoriesPipeline(RedditVideoPipeline):
 
         Args:
             post (RedditPost): Reddit post object.
-            background_video (str): Path to the background video.
+            background_video (str): Path to the raw background video.
+            background_audio (str): Path to the raw background audio.
             overlay_media (List[str]): List of paths to the overlay videos.
             captions (CaptionStyle): Caption style object. Defaults to None.
                 If no captions is provided, no captions will be added.
         """
 
-        # Combine Reddit and Background videos
-        overlay_videos(
-            background_video=background_video,
-            overlay_videos=overlay_media,
-            output_path=self.reel_path.format(post_id=post.post_id, suffix="raw"),
-        )
-
+        caption_path = None
         if captions and video_text:
             # Generate captions
+            caption_path = f"assets/posts/{post.post_id}/reel_raw.ass"
             self.stt.generate_captions(
                 input_file=post.body_audio_path,
                 text=video_text,
                 language=post.language,
-                output_file=f"assets/posts/{post.post_id}/reel_raw.ass",
+                output_file=caption_path,
                 style=self.captions,
             )
 
@@ -118,36 +112,25 @@ class RedditStoriesPipeline(RedditVideoPipeline):
             title_duration = get_video_duration(overlay_media[0])
 
             shift_caption_start(
-                input_file=f"assets/posts/{post.post_id}/reel_raw.ass",
+                input_file=caption_path,
                 start_time=title_duration,
             )
 
-            # Add subtitle to video
-            add_captions(
-                input_file=self.reel_path.format(post_id=post.post_id, suffix="raw"),
-                output_file=self.reel_path.format(
-                    post_id=post.post_id,
-                    suffix="subtitled",
-                ),
-                caption_path=f"assets/posts/{post.post_id}/reel_raw.ass",
-                font_path=self.captions.font_path,
-            )
-
-        # Add final fade out
-        add_fade_out(
-            input_path=self.reel_path.format(
-                post_id=post.post_id,
-                suffix="subtitled" if captions else "raw",
-            ),
-        )
-
-        # Extract thumbnail
-        extract_video_thumbnail(
-            video_path=self.reel_path.format(
+        # Combine Reddit and Background videos, add captions, fade out and extract the thumbnail
+        render_final_reel(
+            background_video=background_video,
+            background_audio=background_audio,
+            background_audio_volume=self.background_audio_volume,
+            background_fade_duration=1,
+            overlay_videos=overlay_media,
+            output_path=self.reel_path.format(
                 post_id=post.post_id,
-                suffix="subtitled" if captions else "raw",
+                suffix="subtitled" if caption_path else "raw",
             ),
-            output_path=f"assets/posts/{post.post_id}/thumbnail.png",
+            thumbnail_path=f"assets/posts/{post.post_id}/thumbnail.png",
+            caption_path=caption_path,
+            font_path=self.captions.font_path if caption_path else "assets/fonts",
+            fade_out_duration=1.5,
         )
 
         logger.info(f"Video created for post {post.post_id}")
@@ -179,34 +162,32 @@ class RedditStoriesPipeline(RedditVideoPipeline):
         # Take post title screenshot
         await take_post_screenshot(post, elements=["header", "title", "action_row"])
 
-        # Generate media for post
-        self.generate_title_media(post)
-        logger.info(f"Media generated for the post title: {post.title}")
-
-        # Generate story audio
-        self.tts.generate_audio_clip(
-            post.body,
-            output_path=post.body_audio_path,
-            speaker=self.speaker,
-            speed=self.audio_speed,
+        # Generate media for post title and story audio at the same time
+        await asyncio.gather(
+            asyncio.to_thread(self.generate_title_media, post),
+            asyncio.to_thread(
+                self.tts.generate_audio_clip,
+                post.body,
+                output_path=post.body_audio_path,
+                speaker=self.speaker,
+                speed=self.audio_speed,
+            ),
         )
+        logger.info(f"Media generated for the post title: {post.title}")
         logger.info(f"Audio generated for the post body: {post.body}")
 
         # Combine media
         overlay_media = [post.video_path, post.body_audio_path]
 
-        overlay_duration = sum(get_video_duration(video) for video in overlay_media) + 1
-
-        # Generate media for background video
-        background_video = self.get_background_video(
-            post=post,
-            duration=overlay_duration,
+        # Select the background media, it is cut and mixed while rendering the reel
+        background_video, background_audio = self.get_background_media(
             video_file=self.background_video_name,
             audio_file=self.background_audio_name,
             video_condition={"topic": "satisfying"},
         )
-
-        logger.info(f"Background video generated at: {background_video}")
+        logger.info(
+            f"Background media selected: {background_video}, {background_audio}",
+        )
 
         # Clean and save subtitles text
         cleaned_text = re.sub(r"[()]", ",", post.body)
@@ -217,6 +198,7 @@ class RedditStoriesPipeline(RedditVideoPipeline):
         self.generate_reel_video(
             post=post,
             background_video=background_video,
+            background_audio=background_audio,
             overlay_media=overlay_media,
             captions=self.captions,
             video_text=cleaned_text if self.captions else None,
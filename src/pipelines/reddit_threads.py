@@ -2,24 +2,24 @@
 
 import asyncio
 import re
-from typing import List, Literal, Optional, Tuple, Union
+from typing import List, Literal, Optional, Union
 
 from loguru import logger
-from tqdm import tqdm
+from tqdm.contrib.concurrent import thread_map
 
 from src.config import settings
 from src.pipelines.schemas import RedditVideoPipeline
 from src.schemas import CaptionStyle, RedditComment, RedditPost, Speaker
+from src.utils.common import group_similar_texts
 from src.utils.media.audio import concatenate_audio_files, get_audio_duration
 from src.utils.media.video import (
-    add_captions,
     create_image_videoclip,
-    extract_video_thumbnail,
-    get_video_duration,
-    overlay_videos,
+    create_image_videoclip_concat,
+    get_video_durations,
+    render_final_reel,
 )
 from src.utils.reddit.post import get_reddit_object
-from src.utils.reddit.screenshot import take_comment_screenshot, take_post_screenshot
+from src.utils.reddit.screenshot import take_screenshots
 
 
 class RedditThreadPipeline(RedditVideoPipeline):
@@ -65,13 +65,13 @@ class RedditThreadPipeline(RedditVideoPipeline):
         self.background_video_path = (
             "assets/posts/{post_id}/video/background_video_{suffix}.mp4"
         )
-        self.background_audio_path = "assets/posts/{post_id}/audio/background_audio.mp3"
 
     def get_comments(
         self,
         post: RedditPost,
         sort_by_score: bool = False,
         filter_duplicates: bool = True,
+        batch_size: int = 4,
     ) -> List[RedditComment]:
         """
         Get comments from the Reddit post. We are filtering out comments that are too long.
@@ -81,6 +81,7 @@ class RedditThreadPipeline(RedditVideoPipeline):
             post (RedditPost): The Reddit post object.
             sort_by_score (bool): Whether to sort the comments by score.
             filter_duplicates (bool): Whether to filter out duplicate comments.
+            batch_size (int): Maximum number of comment audios generated concurrently.
         """
 
         comments = [
@@ -96,25 +97,49 @@ class RedditThreadPipeline(RedditVideoPipeline):
             comments = self.filter_duplicate_comments(comments)
 
         duration = 0
+        speech_duration = 0
         processed_comments = []
-        for comment in comments:
+        pending = comments
+        while pending:
+            # Once some clips exist, size the batch from the time left, estimated with their
+            # seconds per character, so few audios are generated and then discarded
+            size = batch_size
+            if speech_duration:
+                seconds_per_char = speech_duration / sum(
+                    len(comment.body) for comment in processed_comments
+                )
+                remaining = settings.MIN_VIDEO_DURATION - duration
+                size = 0
+                for comment in pending[:batch_size]:
+                    size += 1
+                    remaining -= (
+                        len(comment.body) * seconds_per_char + self.silence_duration
+                    )
+                    if remaining <= 0:
+                        break
+
+            batch, pending = pending[:size], pending[size:]
+
             # Audio
-            self.tts.generate_audio_clip(
-                comment.body,
+            self.tts.generate_audio_clips(
+                [comment.body for comment in batch],
+                output_paths=[comment.audio_path for comment in batch],
                 speaker=self.speaker,
-                output_path=comment.audio_path,
                 speed=self.audio_speed,
             )
 
-            duration += get_audio_duration(comment.audio_path)
-            processed_comments.append(comment)
+            for comment in batch:
+                audio_duration = get_audio_duration(comment.audio_path)
+                speech_duration += audio_duration
+                duration += audio_duration
+                processed_comments.append(comment)
 
-            if duration < settings.MIN_VIDEO_DURATION:
-                duration += self.silence_duration
-                continue
+                if duration < settings.MIN_VIDEO_DURATION:
+                    duration += self.silence_duration
+                    continue
 
-            else:
-                break
+                else:
+                    return processed_comments
 
         return processed_comments
 
@@ -123,37 +148,58 @@ class RedditThreadPipeline(RedditVideoPipeline):
         comments: List[RedditComment],
         threshold: float = 0.80,
         alpha: float = 0.5,
+        prefilter_threshold: float = 0.3,
     ) -> List[RedditComment]:
         """
         Filter out duplicate comments using hybrid semantic + lexical similarity.
+        Comments are first grouped by character shingle similarity, so the hybrid
+        scoring (and the embeddings) only run inside groups with more than one comment.
 
         Args:
             comments: List of RedditComment objects to filter.
             threshold: Minimum similarity score to consider as duplicate (0-1).
             alpha: Weight for hybrid search (0=BM25, 1=vector).
+            prefilter_threshold: Minimum shingle Jaccard similarity to compare two comments.
         """
         if not comments:
             return []
 
         comment_bodies = [c.body for c in comments]
-        self.vector_store.add_documents(comment_bodies)
-        unique_comments, seen = [], set()
+        seen = set()
 
-        for i, body in enumerate(comment_bodies):
-            if i in seen:
+        for group in group_similar_texts(comment_bodies, threshold=prefilter_threshold):
+            if len(group) == 1:
                 continue
 
-            unique_comments.append(comments[i])
-            seen.add(i)
-
-            for sim_body, score in self.vector_store.hybrid_search(
-                body,
-                k=len(comment_bodies),
+            group_bodies = [comment_bodies[i] for i in group]
+            # The comments are searched against each other, so the document embeddings
+            # are reused as the query embeddings
+            group_embeddings = self.vector_store.add_documents(group_bodies)
+            group_results = self.vector_store.batch_hybrid_search(
+                group_bodies,
+                k=len(group_bodies),
                 alpha=alpha,
-            ):
-                if sim_body != body and score >= threshold:
-                    seen.add(comment_bodies.index(sim_body))
+                query_embeddings=group_embeddings,
+            )
+            kept = set()
+
+            # Position of each body in the group, keeping the first one of exact copies
+            body_positions = {}
+            for position, body in enumerate(group_bodies):
+                body_positions.setdefault(body, position)
 
+            for i, body, results in zip(group, group_bodies, group_results):
+                if i in seen:
+                    continue
+
+                kept.add(i)
+                for sim_body, score in results:
+                    if sim_body != body and score >= threshold:
+                        sim_index = group[body_positions[sim_body]]
+                        if sim_index not in kept:
+                            seen.add(sim_index)
+
+        unique_comments = [c for i, c in enumerate(comments) if i not in seen]
         logger.info(
             f"Filtered {len(comments) - len(unique_comments)} duplicate comments",
         )
@@ -163,19 +209,22 @@ class RedditThreadPipeline(RedditVideoPipeline):
         self,
         post: RedditPost,
         comments: List[RedditComment],
+        max_concurrency: int = 8,
     ) -> None:
         """
         Take the post and comments screenshots using the async api of playwright.
+        All the screenshots share a single browser and logged in context.
+
         Args:
             post (RedditPost): The Reddit post object.
             comments (List[RedditComment]): The list of comments to take screenshots from.
+            max_concurrency (int): Maximum number of pages open at the same time.
         """
-        await asyncio.gather(
-            take_post_screenshot(post, theme=self.theme),
-            *(
-                take_comment_screenshot(comment, theme=self.theme)
-                for comment in comments
-            ),
+        await take_screenshots(
+            post,
+            comments,
+            theme=self.theme,
+            max_concurrency=max_concurrency,
         )
 
     def generate_post_media(self, post: RedditPost) -> None:
@@ -186,47 +235,40 @@ class RedditThreadPipeline(RedditVideoPipeline):
             post (RedditPost): The Reddit post object.
         """
 
-        # Audio
-        self.tts.generate_audio_clip(
-            post.title,
-            output_path=post.title_audio_path,
+        # Audio (an invalid body path is skipped for posts without body text)
+        self.tts.generate_audio_clips(
+            [post.title, post.body],
+            output_paths=[post.title_audio_path, post.body_audio_path],
             speaker=self.speaker,
             speed=self.audio_speed,
         )
 
-        self.tts.generate_audio_clip(
-            post.body,
-            speaker=self.speaker,
-            output_path=post.body_audio_path,
-            speed=self.audio_speed,
-        )
-
         # We filter None values to deal with post without body text
         post_audios = list(filter(None, [post.title_audio_path, post.body_audio_path]))
 
-        concatenate_audio_files(
-            files=post_audios,
-            silence_duration=self.silence_duration,
-            output_file=post.audio_path,
-        )
-
         # Video
-        create_image_videoclip(
+        create_image_videoclip_concat(
             image_path=post.image_path,
-            audio_path=post.audio_path,
+            audio_paths=post_audios,
             output_path=post.video_path,
+            silence_duration=self.silence_duration,
         )
 
-    def generate_comments_media(self, comments: List[RedditComment]) -> None:
+    def generate_comments_media(
+        self,
+        comments: List[RedditComment],
+        max_workers: int = 4,
+    ) -> None:
         """
         Generate audio, image and video clips for each comment in the post.
+        The clips are encoded in parallel, each one in its own ffmpeg process.
 
         Args:
             comments (List[RedditComment]): The list of comments to generate media for.
+            max_workers (int): Maximum number of ffmpeg processes at the same time.
         """
 
-        # Filter comments by length
-        for comment in tqdm(comments, desc="Processing comments"):
+        def _generate_comment_media(comment: RedditComment) -> None:
             try:
                 # Video
                 create_image_videoclip(
@@ -240,14 +282,22 @@ class RedditThreadPipeline(RedditVideoPipeline):
                 logger.error(f"Error generating comment media: {comment}")
                 raise e
 
+        thread_map(
+            _generate_comment_media,
+            comments,
+            max_workers=max_workers,
+            desc="Processing comments",
+        )
+
     def get_reddit_videos(
         self,
         post: RedditPost,
         comments: List[RedditComment],
         outro_path: str,
-    ) -> Tuple[List[str], float]:
+    ) -> List[str]:
         """
-        Join all the generated Reddit post and comment videos into a single video.
+        Get the paths of the Reddit post, comment and outro videos, in the order they are
+        placed in the reel.
 
         Args:
             post (RedditPost): The post to join videos for.
@@ -255,24 +305,17 @@ class RedditThreadPipeline(RedditVideoPipeline):
             outro_path (str): The path to the outro video.
         """
 
-        videos = (
+        return (
             [post.video_path]
             + [comment.video_path for comment in comments]
             + [outro_path]
         )
 
-        # Calculate the total duration of the videos to later cut the background video
-        # Note that I need to sum the silence seconds duration between each video
-        total_duration = sum(
-            get_video_duration(video) for video in videos
-        ) + self.silence_duration * (len(videos) - 1)
-
-        return videos, total_duration
-
     def generate_reel_video(
         self,
         post: RedditPost,
         background_video: str,
+        background_audio: str,
         reddit_videos: List[str],
         captions: CaptionStyle = None,
         video_text: str = None,
@@ -282,47 +325,50 @@ class RedditThreadPipeline(RedditVideoPipeline):
 
         Args:
             post (RedditPost): Reddit post object.
-            background_video (str): Path to the background video.
+            background_video (str): Path to the raw background video.
+            background_audio (str): Path to the raw background audio.
             reddit_videos (List[str]): List of paths to the Reddit videos.
             captions (CaptionStyle): Caption style object. Defaults to None.
                 If no captions is provided, no captions will be added.
         """
 
-        # Combine Reddit and Background videos
-        overlay_videos(
-            background_video=background_video,
-            overlay_videos=reddit_videos,
-            output_path=self.reel_path.format(post_id=post.post_id, suffix="raw"),
-        )
-
+        caption_path = None
         if captions and video_text:
+            # Join the Reddit videos audio to align the captions with the narration. Each
+            # audio is fitted to its video duration, where the reel places the next video,
+            # so the small audio and video differences do not add up into a caption drift
+            narration_path = f"assets/posts/{post.post_id}/audio/narration.wav"
+            concatenate_audio_files(
+                files=reddit_videos,
+                silence_duration=0,
+                output_file=narration_path,
+                durations=get_video_durations(reddit_videos),
+            )
 
             # Generate captions
+            caption_path = f"assets/posts/{post.post_id}/reel_raw.ass"
             self.stt.generate_captions(
-                input_file=self.reel_path.format(post_id=post.post_id, suffix="raw"),
+                input_file=narration_path,
                 text=video_text,
                 language=post.language,
-                output_file=f"assets/posts/{post.post_id}/reel_raw.ass",
+                output_file=caption_path,
                 style=self.captions,
             )
 
-            # Add subtitle to video
-            add_captions(
-                input_file=self.reel_path.format(post_id=post.post_id, suffix="raw"),
-                output_file=self.reel_path.format(
-                    post_id=post.post_id,
-                    suffix="subtitled",
-                ),
-                caption_path=f"assets/posts/{post.post_id}/reel_raw.ass",
-                font_path=self.captions.font_path,
-            )
-
-        extract_video_thumbnail(
-            video_path=self.reel_path.format(
+        # Combine Reddit and Background videos, add captions and extract the thumbnail
+        render_final_reel(
+            background_video=background_video,
+            background_audio=background_audio,
+            background_audio_volume=self.background_audio_volume,
+            background_fade_duration=1,
+            overlay_videos=reddit_videos,
+            output_path=self.reel_path.format(
                 post_id=post.post_id,
-                suffix="subtitled" if captions else "raw",
+                suffix="subtitled" if caption_path else "raw",
             ),
-            output_path=f"assets/posts/{post.post_id}/thumbnail.png",
+            thumbnail_path=f"assets/posts/{post.post_id}/thumbnail.png",
+            caption_path=caption_path,
+            font_path=self.captions.font_path if caption_path else "assets/fonts",
         )
 
         logger.info(f"Video created for post {post.post_id}")
@@ -356,38 +402,33 @@ class RedditThreadPipeline(RedditVideoPipeline):
         # Take screenshots
         await self.take_screenshots(post, comments)
 
-        # Generate media for post and comments
-        self.generate_post_media(post)
+        # Generate media for post, comments and outro at the same time, they are independent
+        _, _, (outro_path, outro_text) = await asyncio.gather(
+            asyncio.to_thread(self.generate_post_media, post),
+            asyncio.to_thread(self.generate_comments_media, comments),
+            asyncio.to_thread(self.generate_outro_media, post, speaker=self.speaker),
+        )
         logger.info(f"Media generated for the post: {post.title}")
-
-        self.generate_comments_media(comments)
         logger.info(f"Media generated for {len(comments)} comments.")
-
-        # Generate media for outro
-        outro_path, outro_text = self.generate_outro_media(
-            post,
-            speaker=self.speaker,
-        )
         logger.info(f"Outro media generated at: {outro_path}")
 
         # Combine reddit videos
-        reddit_videos, reddit_video_duration = self.get_reddit_videos(
+        reddit_videos = self.get_reddit_videos(
             post,
             comments,
             outro_path,
         )
         logger.info(f"Combined {len(reddit_videos)} videos into a single reel video.")
 
-        # Generate media for background video
-        background_video = self.get_background_video(
-            post=post,
-            duration=reddit_video_duration,
+        # Select the background media, it is cut and mixed while rendering the reel
+        background_video, background_audio = self.get_background_media(
             video_file=self.background_video_name,
             audio_file=self.background_audio_name,
             video_condition={"topic": "gameplay"},
         )
-
-        logger.info(f"Background video generated at: {background_video}")
+        logger.info(
+            f"Background media selected: {background_video}, {background_audio}",
+        )
         video_text = "\n".join(
             [post.title, post.body]
             + [comment.body for comment in comments]
@@ -403,6 +444,7 @@ class RedditThreadPipeline(RedditVideoPipeline):
         self.generate_reel_video(
             post=post,
             background_video=background_video,
+            background_audio=background_audio,
             reddit_videos=reddit_videos,
             captions=self.captions,
             video_text=cleaned_text if self.captions else None,
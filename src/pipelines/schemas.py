@@ -1,10 +1,9 @@
 # -*- coding: utf-8 -*-
-import csv
-import json
+import os
 import random
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Optional, Tuple, Union
 
 from loguru import logger
 
@@ -12,14 +11,26 @@ from src.config import settings
 from src.pipelines.indexation import vector_store
 from src.pipelines.stt import stt_pipeline
 from src.pipelines.tts import tts_pipeline
-from src.schemas import CaptionStyle, MediaFile, RedditPost, Speaker
-from src.utils.media.audio import cut_audio
-from src.utils.media.video import (
-    combine_video_with_audio,
-    create_image_videoclip,
-    cut_video,
-    resize_video,
+from src.schemas import (
+    CaptionStyle,
+    RedditPost,
+    Speaker,
+    download_media_files,
+    filter_media_files,
+    load_languages,
 )
+from src.utils.media.video import build_background_video, create_image_videoclip
+
+PROCESSED_VIDEOS_FIELDS = ["post_id", "title", "url", "timestamp", "pipeline"]
+
+
+def _csv_escape(value: str) -> str:
+    """
+    Quote a CSV field if it contains a delimiter, a quote or a line break.
+    """
+    if any(char in value for char in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
 
 
 class RedditVideoPipeline(ABC):
@@ -63,17 +74,11 @@ class RedditVideoPipeline(ABC):
             speaker (Speaker): The speaker to use for the audio.
         """
 
-        outro = [
-            lang["outro"]
-            for lang in json.load(open("./data/languages.json"))
-            if lang["lang_code"] == post.language
-        ]
-
-        outro_text = outro[0]
+        outro_text = load_languages()[post.language]["outro"]
 
         self.tts.generate_audio_clip(
             text=outro_text,
-            output_path=f"./assets/others/outros/outro_{post.language}_{speaker.name}.mp3",
+            output_path=f"./assets/others/outros/outro_{post.language}_{speaker.name}.wav",
             speaker=speaker,
             speed=1.3,  # Fix the outro speed to 1.3
         )
@@ -84,57 +89,38 @@ class RedditVideoPipeline(ABC):
 
         create_image_videoclip(
             image_path="./assets/others/outros/outro.png",
-            audio_path=f"./assets/others/outros/outro_{post.language}_{speaker.name}.mp3",
+            audio_path=f"./assets/others/outros/outro_{post.language}_{speaker.name}.wav",
             output_path=outro_output_path,
         )
 
         return outro_output_path, outro_text
 
-    def get_background_video(
+    def get_background_media(
         self,
-        post: RedditPost,
-        duration: float,
         video_file: str = None,
         audio_file: str = None,
         video_condition: Dict[str, Any] = None,
-    ) -> str:
+    ) -> Tuple[str, str]:
         """
-        Get the background video for the post.
+        Select and download the raw background video and audio files.
 
         Args:
-            post (RedditPost): The post to get the background video for.
-            duration (float): The duration of the background video.
             video_file (str): The name of the background video file name.
                 If None, a random background video will be selected.
             audio_file (str): The name of the background audio file name.
                 If None, a random background audio will be selected.
             video_condition (Dict[str, Any]): The condition to filter the background videos.
                 If None, no condition will be applied. Example: {"topic": "gameplay"}
+
+        Returns:
+            Tuple[str, str]: The paths to the background video and audio files.
         """
 
-        if video_condition:
-            videos = [
-                MediaFile(**video)
-                for video in json.load(open(settings.BACKGROUND_VIDEOS_JSON))
-                if MediaFile(**video).type == "background"
-                and all(
-                    getattr(MediaFile(**video), key) == value
-                    for key, value in video_condition.items()
-                )
-            ]
-
-        else:
-            videos = [
-                MediaFile(**video)
-                for video in json.load(open(settings.BACKGROUND_VIDEOS_JSON))
-                if MediaFile(**video).type == "background"
-            ]
-
-        audios = [
-            MediaFile(**audio)
-            for audio in json.load(open(settings.BACKGROUND_AUDIOS_JSON))
-            if MediaFile(**audio).type == "background"
-        ]
+        videos = filter_media_files(
+            settings.BACKGROUND_VIDEOS_JSON,
+            **{"type": "background", **(video_condition or {})},
+        )
+        audios = filter_media_files(settings.BACKGROUND_AUDIOS_JSON, type="background")
 
         # Select specific video and audio files if provided, otherwise select random ones
         video = next(
@@ -147,59 +133,55 @@ class RedditVideoPipeline(ABC):
         )
 
         # Download the files if they are not already downloaded
-        video.download()
-        audio.download()
+        download_media_files([video, audio])
 
-        # Audio
-        cut_audio(
-            input_path=audio.path,
-            output_path=self.background_audio_path.format(post_id=post.post_id),
-            duration=duration,
-            fade_duration=1,
-        )
+        return video.path, audio.path
 
-        # Video
-        cut_video(
-            input_path=video.path,
-            output_path=self.background_video_path.format(
-                post_id=post.post_id,
-                suffix="cutted",
-            ),
-            duration=duration,
-        )
+    def get_background_video(
+        self,
+        post: RedditPost,
+        duration: float,
+        video_file: str = None,
+        audio_file: str = None,
+        video_condition: Dict[str, Any] = None,
+    ) -> str:
+        """
+        Get the background video for the post, cut and mixed with the background audio.
 
-        resize_video(
-            input_path=self.background_video_path.format(
-                post_id=post.post_id,
-                suffix="cutted",
-            ),
-            output_path=self.background_video_path.format(
-                post_id=post.post_id,
-                suffix="cutted_croped",
-            ),
-            height=settings.SCREEN_HEIGHT,
-            width=settings.SCREEN_WIDTH,
-            zoom_crop=True,
-        )
+        Args:
+            post (RedditPost): The post to get the background video for.
+            duration (float): The duration of the background video.
+            video_file (str): The name of the background video file name.
+                If None, a random background video will be selected.
+            audio_file (str): The name of the background audio file name.
+                If None, a random background audio will be selected.
+            video_condition (Dict[str, Any]): The condition to filter the background videos.
+                If None, no condition will be applied. Example: {"topic": "gameplay"}
+        """
 
-        # Combine background video and audio
-        combine_video_with_audio(
-            video_path=self.background_video_path.format(
-                post_id=post.post_id,
-                suffix="cutted_croped",
-            ),
-            audio_path=self.background_audio_path.format(post_id=post.post_id),
-            output_path=self.background_video_path.format(
-                post_id=post.post_id,
-                suffix="finished",
-            ),
-            volume=self.background_audio_volume,
+        video_path, audio_path = self.get_background_media(
+            video_file=video_file,
+            audio_file=audio_file,
+            video_condition=video_condition,
         )
 
-        return self.background_video_path.format(
+        # Cut, resize and mix the background video and audio in a single pass
+        output_path = self.background_video_path.format(
             post_id=post.post_id,
             suffix="finished",
         )
+        build_background_video(
+            video_path=video_path,
+            audio_path=audio_path,
+            output_path=output_path,
+            width=settings.SCREEN_WIDTH,
+            height=settings.SCREEN_HEIGHT,
+            duration=duration,
+            volume=self.background_audio_volume,
+            fade_duration=1,
+        )
+
+        return output_path
 
     def save_record(self, post: RedditPost) -> None:
         """
@@ -209,25 +191,29 @@ class RedditVideoPipeline(ABC):
             post (RedditPost): The Reddit post object.
         """
 
-        with open(settings.PROCESSED_VIDEOS_CSV, "a", newline="") as csvfile:
-            fieldnames = ["post_id", "title", "url", "timestamp", "pipeline"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-            # Write header if the file is empty
-            if csvfile.tell() == 0:
-                writer.writeheader()
-
-            writer.writerow(
-                {
-                    "post_id": post.post_id,
-                    "title": post.title,
-                    "url": post.url,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d:%H:%M:%S"),
-                    "pipeline": self.name,
-                },
-            )
-
-            logger.info(f"Record saved for post {post.post_id}")
+        fields = [
+            post.post_id,
+            post.title,
+            post.url,
+            datetime.now().strftime("%Y-%m-%d:%H:%M:%S"),
+            self.name,
+        ]
+        line = ",".join(_csv_escape(field) for field in fields) + "\r\n"
+
+        # Append the row with a single write, adding the header if the file is empty
+        fd = os.open(
+            settings.PROCESSED_VIDEOS_CSV,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        try:
+            if os.fstat(fd).st_size == 0:
+                line = ",".join(PROCESSED_VIDEOS_FIELDS) + "\r\n" + line
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+        logger.info(f"Record saved for post {post.post_id}")
 
     @abstractmethod
     def generate_reel_video(self) -> None:
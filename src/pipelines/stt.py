@@ -1,13 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import importlib.util
+import os
+import shutil
 import ssl
+from typing import Any, ClassVar, Dict, Optional, Tuple
 
 import pysubs2
 import stable_whisper
 import streamlit as st
+import torch
 from loguru import logger
 
+from src.config import settings
 from src.schemas import CaptionStyle
+from src.utils.common import create_file_folder, get_device
 
 
 class SpeechToText:
@@ -16,21 +24,81 @@ class SpeechToText:
     More info: https://github.com/jianfch/stable-ts
     """
 
-    def __init__(self, model_name: str = "large-v3-turbo"):
+    # Loaded models shared across instances, by model name and backend
+    _models: ClassVar[Dict[Tuple[str, Optional[str]], Any]] = {}
+
+    def __init__(
+        self,
+        model_name: str = "large-v3-turbo",
+        compute_type: Optional[str] = settings.WHISPER_COMPUTE_TYPE,
+    ):
         """
         See all available models at:
         - https://github.com/openai/whisper/blob/main/model-card.md#model-details
+
+        Args:
+            model_name (str): Whisper model name.
+            compute_type (str): CTranslate2 compute type (e.g. "int8_float16", "float16").
+                If provided, the model is loaded with the faster-whisper backend, which needs
+                the `faster-whisper` package. If None, the original PyTorch Whisper is used.
         """
+        # The model is loaded lazily, so check the backend now instead of failing mid-run
+        if compute_type and importlib.util.find_spec("faster_whisper") is None:
+            raise ImportError(
+                f"Running Whisper with compute type {compute_type} needs faster-whisper. "
+                "Install it with `uv sync --extra faster-whisper` or unset "
+                "WHISPER_COMPUTE_TYPE.",
+            )
+
         self.model_name = model_name
-        self._model = None  # Defer loading until first use
-        self._device = None  # Defer loading until first use
+        self.compute_type = compute_type
 
     @property
     def model(self):
-        if self._model is None:
+        # Defer loading until first use, so the model is never loaded if captions are disabled
+        key = (self.model_name, self.compute_type)
+        if key not in self._models:
             ssl._create_default_https_context = ssl._create_unverified_context
-            self._model = stable_whisper.load_model(self.model_name)
-        return self._model
+            if self.compute_type:
+                # faster-whisper only runs on CUDA or CPU, and CPU does not support float16
+                device = "cuda" if get_device() == "cuda" else "cpu"
+                self._models[key] = stable_whisper.load_faster_whisper(
+                    self.model_name,
+                    device=device,
+                    compute_type=self.compute_type if device == "cuda" else "int8",
+                )
+            else:
+                self._models[key] = stable_whisper.load_model(self.model_name)
+        return self._models[key]
+
+    def get_cache_path(
+        self,
+        input_file: str,
+        text: str,
+        language: str,
+        style: CaptionStyle,
+    ) -> str:
+        """
+        Get the cache path of the raw captions alignment. The key is a hash of the audio content,
+        the text, the language, the model and the caption levels used to export the alignment.
+
+        Args:
+            input_file (str): Path to the audio/video file.
+            text (str): Text to align with the audio.
+            language (str): Language of the text.
+            style (CaptionStyle): Style to apply to the captions.
+        """
+        key = hashlib.sha256()
+        with open(input_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                key.update(chunk)
+
+        key.update(
+            f"{text}|{language}|{self.model_name}|{self.compute_type}|"
+            f"{style.segment_level}|{style.word_levels}".encode(),
+        )
+
+        return os.path.join(settings.CAPTIONS_CACHE_PATH, f"{key.hexdigest()}.ass")
 
     def generate_captions(
         self,
@@ -55,22 +123,31 @@ class SpeechToText:
         if not style:
             style = CaptionStyle()
 
-        # Generate raw captions
-        raw_caps = self.model.align(input_file, text, language=language)
-        raw_caps.to_ass(
-            output_file,
-            segment_level=style.segment_level,
-            word_level=style.word_levels,
-        )
+        # Generate raw captions, reusing a previous alignment of the same audio and text
+        cache_file = self.get_cache_path(input_file, text, language, style)
+
+        if os.path.exists(cache_file):
+            logger.info(f"Using cached captions alignment: {cache_file}")
+        else:
+            create_file_folder(cache_file)
+            # No gradients are needed, skip the autograd bookkeeping
+            with torch.inference_mode():
+                raw_caps = self.model.align(input_file, text, language=language)
+            raw_caps.to_ass(
+                cache_file,
+                segment_level=style.segment_level,
+                word_level=style.word_levels,
+            )
+
+        create_file_folder(output_file)
+        shutil.copyfile(cache_file, output_file)
 
         # Apply style
         caps = pysubs2.load(output_file, format="ass")
 
-        for property, value in style:
-            # Filter out invalid pysub2 properties
-            if "_" in property:
-                continue
-            setattr(caps.styles["Default"], property, value)
+        default_style = caps.styles["Default"]
+        for property, value in style.pysubs2_dict.items():
+            setattr(default_style, property, value)
 
         caps.save(output_file, format="ass")
         logger.info(f"Captions generated in: {output_file}")
@@ -1,18 +1,48 @@
 # -*- coding: utf-8 -*-
-import json
+import asyncio
+import hashlib
 import os
 import re
+import shutil
 import tempfile
 import time
+from typing import Dict, List
 
 import edge_tts
 import ffmpeg
 import streamlit as st
 from loguru import logger
 
-from src.schemas import Speaker
+from src.config import settings
+from src.schemas import Speaker, load_languages
 from src.utils.common import create_file_folder
 
+# Text sanitization patterns, compiled once
+URLS_PATTERN = re.compile(
+    r"((http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.([a-zA-Z]){2,6}([a-zA-Z0-9\.\&\/\?\:@\-_=#])*",  # noqa: E501
+)
+# Brazilian laughs (group 1) or symbols, replaced in a single pass
+LAUGHS_SYMBOLS_PATTERN = re.compile(
+    r"(\b[kK]{4,}\b)|\s['|’]|['|’]\s|[\^_~@!&;#:\-%—“”‘\"%\*/{}\[\]\(\)\\|<>=+]",
+)
+
+
+def build_atempo_filter(speed: float) -> str:
+    """
+    Build the ffmpeg atempo filter chain for a speed factor. Since ffmpeg 4.3 a single
+    atempo filter supports factors between 0.5 and 100, so only slow downs below 0.5
+    need to be chained.
+
+    Args:
+        speed (float): Speed factor (e.g., 1.3 for 30% faster).
+    """
+    filters = []
+    while speed < 0.5:
+        filters.append("atempo=0.5")
+        speed *= 2.0
+    filters.append(f"atempo={speed}")
+    return ",".join(filters)
+
 
 class TextToSpeech:
     """
@@ -26,7 +56,9 @@ class TextToSpeech:
         """
         See all available models at by running `tts --list_models`
         """
-        self.languages = json.load(open("./data/languages.json"))
+        self.languages = load_languages()
+        # Clips being synthesized, by cache path
+        self._pending_clips: Dict[str, asyncio.Future] = {}
 
     def sanitize_text(self, text: str) -> str:
         """
@@ -39,17 +71,16 @@ class TextToSpeech:
             text (str): Text to be sanitized
         """  # noqa: W605
 
-        # remove any urls from the text
-        regex_urls = r"((http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.([a-zA-Z]){2,6}([a-zA-Z0-9\.\&\/\?\:@\-_=#])*"  # noqa: E501
-        result = re.sub(regex_urls, " ", text)
-
-        # normalize Brazilian laughs
-        result = re.sub(r"\b[kK]{4,}\b", "kkk", result)
+        # remove any urls from the text. Every url needs a dot, so most comments
+        # skip the (backtracking) url pattern entirely
+        result = URLS_PATTERN.sub(" ", text) if "." in text else text
 
-        # note: not removing apostrophes
-        regex_expr = r"\s['|’]|['|’]\s|[\^_~@!&;#:\-%—“”‘\"%\*/{}\[\]\(\)\\|<>=+]"
-        result = re.sub(regex_expr, " ", result)
-        result = result.replace("+", "plus").replace("&", "and")
+        # normalize Brazilian laughs and remove symbols (note: not removing apostrophes).
+        # "+" and "&" are symbols too, so they are removed and never spelled out
+        result = LAUGHS_SYMBOLS_PATTERN.sub(
+            lambda match: "kkk" if match.group(1) else " ",
+            result,
+        )
         result = " ".join(result.split())
 
         return result[:-1] if result.endswith(".") else result
@@ -70,24 +101,13 @@ class TextToSpeech:
                 If None, overwrite the input file safely.
         """
 
-        def _build_atempo_chain(speed):
-            filters = []
-            while speed > 2.0:
-                filters.append("atempo=2.0")
-                speed /= 2.0
-            while speed < 0.5:
-                filters.append("atempo=0.5")
-                speed *= 2.0
-            filters.append(f"atempo={speed}")
-            return ",".join(filters)
-
-        atempo_filter = _build_atempo_chain(speed)
+        atempo_filter = build_atempo_filter(speed)
 
         if output_path is None:
             # Create temp file in the same directory as input
             input_dir = os.path.dirname(input_path) or "."
             with tempfile.NamedTemporaryFile(
-                suffix=".mp3",
+                suffix=os.path.splitext(input_path)[-1],
                 dir=input_dir,
                 delete=False,
             ) as tmp_file:
@@ -111,10 +131,7 @@ class TextToSpeech:
                 raise e
 
         else:
-            # Ensure output directory exists
-            output_dir = os.path.dirname(output_path)
-            if output_dir:
-                os.makedirs(output_dir, exist_ok=True)
+            create_file_folder(output_path)
 
             # Process directly to output path
             (
@@ -123,7 +140,94 @@ class TextToSpeech:
                 .run(overwrite_output=True)
             )
 
-    def generate_audio_clip(
+    def get_cache_path(
+        self,
+        text: str,
+        speaker: Speaker,
+        speed: float,
+        extension: str = ".wav",
+    ) -> str:
+        """
+        Get the cache path of a generated audio clip. The key is a hash of the sanitized
+        text, the speaker voice and the speed, so repeated texts (e.g. outros or short
+        comments) are only synthesized once per speaker.
+
+        Args:
+            text (str): Sanitized text of the audio clip.
+            speaker (Speaker): Speaker of the audio clip.
+            speed (float): Speed of the audio clip.
+            extension (str): Extension (format) of the audio clip.
+        """
+        key = hashlib.sha256(f"{text}|{speaker.name}|{speed}".encode()).hexdigest()
+        return os.path.join(settings.TTS_CACHE_PATH, f"{key}{extension}")
+
+    async def _synthesize(
+        self,
+        text: str,
+        cache_path: str,
+        speaker: Speaker,
+        speed: float = 1.0,
+    ) -> None:
+        """
+        Synthesize a sanitized text with edge-tts into the cache. The clip is written to a
+        temporary file and renamed, so readers never see a partial clip.
+
+        Args:
+            text: Sanitized text to convert to speech
+            cache_path: Path of the audio clip in the cache
+            speaker: Speaker to use for the audio clip.
+            speed: Speed of the audio clip. Default is 1.0
+        """
+        create_file_folder(cache_path)
+        extension = os.path.splitext(cache_path)[-1]
+        with tempfile.NamedTemporaryFile(
+            suffix=extension,
+            dir=os.path.dirname(cache_path),
+            delete=False,
+        ) as tmp_file:
+            temp_path = tmp_file.name
+
+        try:
+            communicate = edge_tts.Communicate(text, speaker.name)
+
+            if speed == 1.0 and extension == ".mp3":
+                # Edge TTS already returns MP3, save it as it is
+                await communicate.save(temp_path)
+
+            else:
+                # Keep the audio in memory and decode it (and speed it up) while
+                # writing it, so the clip is never encoded twice. WAV outputs
+                # are stored as PCM, so the next ffmpeg stages skip the MP3 decode
+                audio = bytearray()
+                async for chunk in communicate.stream():
+                    if chunk["type"] == "audio":
+                        audio.extend(chunk["data"])
+
+                output_args = {}
+                if speed != 1.0:
+                    output_args["filter:a"] = build_atempo_filter(speed)
+
+                stream = ffmpeg.input("pipe:0").output(
+                    temp_path,
+                    loglevel="quiet",
+                    **output_args,
+                )
+
+                # ffmpeg is blocking, run it in a thread to not stall other requests
+                await asyncio.to_thread(
+                    stream.run,
+                    input=bytes(audio),
+                    overwrite_output=True,
+                )
+
+            os.replace(temp_path, cache_path)
+
+        finally:
+            # Never leave a partial clip behind
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    async def agenerate_audio_clip(
         self,
         text: str,
         output_path: str,
@@ -131,7 +235,7 @@ class TextToSpeech:
         speed: float = 1.0,
     ) -> None:
         """
-        Generate an audio clip from text
+        Generate an audio clip from text using the async api of edge-tts.
 
         Args:
             text: Text to convert to speech
@@ -154,10 +258,6 @@ class TextToSpeech:
         # Create the folder if it doesn't exist
         create_file_folder(output_path)
 
-        folder_path = os.path.dirname(output_path)
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path, exist_ok=True)
-
         start = time.time()
         try:
             sanitized_text = self.sanitize_text(text)
@@ -165,11 +265,25 @@ class TextToSpeech:
             if len(sanitized_text) == 0:
                 logger.info("Text is empty after sanitization. Skipping generation.")
 
-            communicate = edge_tts.Communicate(sanitized_text, speaker.name)
-            communicate.save_sync(output_path)
+            extension = os.path.splitext(output_path)[-1].lower()
+            cache_path = self.get_cache_path(sanitized_text, speaker, speed, extension)
+            if not os.path.exists(cache_path):
+                # Identical texts generated concurrently share a single request
+                task = self._pending_clips.get(cache_path)
+                if task is None or task.get_loop() is not asyncio.get_running_loop():
+                    task = asyncio.ensure_future(
+                        self._synthesize(sanitized_text, cache_path, speaker, speed),
+                    )
+                    self._pending_clips[cache_path] = task
+
+                    def _forget(done: asyncio.Future) -> None:
+                        if self._pending_clips.get(cache_path) is done:
+                            del self._pending_clips[cache_path]
+
+                    task.add_done_callback(_forget)
+                await task
 
-            if speed != 1.0:
-                self.speedup_audio(output_path, speed)
+            shutil.copyfile(cache_path, output_path)
 
             end = time.time()
 
@@ -182,6 +296,60 @@ class TextToSpeech:
             logger.error(f"Error generating audio clip: {e}")
             raise (e)
 
+    def generate_audio_clip(
+        self,
+        text: str,
+        output_path: str,
+        speaker: Speaker,
+        speed: float = 1.0,
+    ) -> None:
+        """
+        Generate an audio clip from text
+
+        Args:
+            text: Text to convert to speech
+            output_path: Path to save the audio clip
+            speaker: Speaker to use for the audio clip. Default is "Abrahan Mack".
+            speed: Speed of the audio clip. Default is 1.0
+
+        """
+        asyncio.run(self.agenerate_audio_clip(text, output_path, speaker, speed))
+
+    def generate_audio_clips(
+        self,
+        texts: List[str],
+        output_paths: List[str],
+        speaker: Speaker,
+        speed: float = 1.0,
+        max_concurrency: int = 8,
+    ) -> None:
+        """
+        Generate several audio clips concurrently. Edge TTS is a network service, so
+        the requests are overlapped instead of waiting for each one in turn.
+
+        Args:
+            texts: Texts to convert to speech
+            output_paths: Paths to save each audio clip
+            speaker: Speaker to use for the audio clips.
+            speed: Speed of the audio clips. Default is 1.0
+            max_concurrency: Maximum number of requests at the same time.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded(text: str, output_path: str) -> None:
+            async with semaphore:
+                await self.agenerate_audio_clip(text, output_path, speaker, speed)
+
+        async def _generate() -> None:
+            await asyncio.gather(
+                *(
+                    _bounded(text, output_path)
+                    for text, output_path in zip(texts, output_paths)
+                ),
+            )
+
+        asyncio.run(_generate())
+
 
 tts_pipeline = TextToSpeech()
 
@@ -2,11 +2,21 @@
 import json
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
 from pathlib import Path
-from typing import ClassVar, Dict, List, Literal, Optional, Tuple
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    FrozenSet,
+    KeysView,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+)
 
-import langid
-import yt_dlp
 from loguru import logger
 from pydantic import BaseModel, model_validator
 from pysubs2 import Color
@@ -14,6 +24,53 @@ from pysubs2 import Color
 from src.utils.common import create_file_folder
 
 
+def list_folder_files(folder_path: str) -> FrozenSet[str]:
+    """
+    List the names of the files of a folder with a single directory scan.
+    The result is cached by path and modification time of the folder, so the folder is
+    only scanned again when files are added or removed (e.g. by another process).
+
+    Args:
+        folder_path (str): Path to the folder.
+    """
+    try:
+        mtime_ns = os.stat(folder_path).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return frozenset()
+
+    return _list_folder_files(folder_path, mtime_ns)
+
+
+@lru_cache(maxsize=128)
+def _list_folder_files(folder_path: str, mtime_ns: int) -> FrozenSet[str]:
+    """
+    Scan the files of a folder.
+
+    Args:
+        folder_path (str): Path to the folder.
+        mtime_ns (int): Modification time of the folder in nanoseconds.
+    """
+    if not os.path.isdir(folder_path):
+        return frozenset()
+
+    with os.scandir(folder_path) as entries:
+        return frozenset(entry.name for entry in entries if entry.is_file())
+
+
+@lru_cache(maxsize=None)
+def load_file_mapping(
+    json_path: str = "data/file_mapping.json",
+) -> Dict[str, List[str]]:
+    """
+    Load the mapping of file types to their extensions. The result is cached by path.
+
+    Args:
+        json_path (str): Path to the JSON file with the file mapping.
+    """
+    with open(json_path) as f:
+        return json.load(f)
+
+
 class MediaFile(BaseModel):
     title: str
     url: str
@@ -23,17 +80,20 @@ class MediaFile(BaseModel):
     topic: Literal["gameplay", "satisfying", "relaxing", "other"] = "other"
     path: Optional[str] = None
 
-    _file_mapping: ClassVar[dict] = json.load(open("data/file_mapping.json"))
+    # Supported extensions mapped to their file type, for O(1) lookups
+    _extension_types: ClassVar[Dict[str, str]] = {
+        extension: file_type
+        for file_type in ("video", "audio")
+        for extension in load_file_mapping().get(file_type, [])
+    }
 
-    @property
+    @cached_property
     def file_type(self) -> str:
         extension = os.path.splitext(self.file_name)[-1].lower().lstrip(".")
-        if extension in self._file_mapping.get("audio", []):
-            return "audio"
-        elif extension in self._file_mapping.get("video", []):
-            return "video"
-        else:
+        file_type = self._extension_types.get(extension)
+        if file_type is None:
             raise ValueError(f"File type not supported: {extension}")
+        return file_type
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -56,13 +116,18 @@ class MediaFile(BaseModel):
             background (MediaFile): Media file object
         """
 
+        # Imported here, as it is only needed when downloading and it is slow to import
+        import yt_dlp
+
         # Check root file path
         root_path = Path(self.path).parent
+        stem, extension = os.path.splitext(self.file_name)
+        is_audio = self.file_type == "audio"
 
         # Create directory structure if it doesn't exist
         create_file_folder(self.path)
 
-        if Path(f"{root_path}/{self.file_name}").is_file():
+        if self.file_name in list_folder_files(str(root_path)):
             logger.info(
                 f"Media file {self.file_name} already exists. Skipping download.",
             )
@@ -72,26 +137,19 @@ class MediaFile(BaseModel):
 
         ydl_opts = {
             # We need to remove the file extension for audio files due to the postprocessing
-            "outtmpl": str(
-                Path(root_path)
-                / (
-                    self.file_name.split(".")[0]
-                    if self.file_type == "audio"
-                    else self.file_name
-                ),
-            ),
+            "outtmpl": str(root_path / (stem if is_audio else self.file_name)),
             "postprocessors": [],
-            "format": "bestaudio/best" if self.file_type == "audio" else "bestvideo",
+            "format": "bestaudio/best" if is_audio else "bestvideo",
             "verbose": False,
         }
 
-        if self.file_type == "audio":
+        if is_audio:
             ydl_opts.update(
                 {
                     "postprocessors": [
                         {
                             "key": "FFmpegExtractAudio",
-                            "preferredcodec": self.file_name.split(".")[-1],
+                            "preferredcodec": extension.lstrip("."),
                             "preferredquality": "192",
                         },
                     ],
@@ -108,6 +166,109 @@ class MediaFile(BaseModel):
             logger.error(f"Failed to download {self.file_name}: {e}")
 
 
+@lru_cache(maxsize=None)
+def load_media_files(json_path: str) -> Tuple[MediaFile, ...]:
+    """
+    Load the media files of a JSON file. The result is cached by path.
+
+    Args:
+        json_path (str): Path to the JSON file with the media files.
+    """
+    with open(json_path) as f:
+        return tuple(MediaFile(**media) for media in json.load(f))
+
+
+@lru_cache(maxsize=None)
+def index_media_files(
+    json_path: str,
+    fields: Tuple[str, ...],
+) -> Dict[Tuple[Any, ...], List[MediaFile]]:
+    """
+    Index the media files of a JSON file by the values of the given fields.
+    The result is cached by path and fields.
+
+    Args:
+        json_path (str): Path to the JSON file with the media files.
+        fields (Tuple[str, ...]): Names of the MediaFile fields to index by.
+            Example: ("topic", "type").
+    """
+    index = {}
+    for media in load_media_files(json_path):
+        key = tuple(getattr(media, field) for field in fields)
+        index.setdefault(key, []).append(media)
+    return index
+
+
+@lru_cache(maxsize=None)
+def load_languages(
+    json_path: str = "./data/languages.json",
+) -> Dict[str, Dict[str, str]]:
+    """
+    Load the supported languages keyed by language code. The result is cached by path.
+
+    Args:
+        json_path (str): Path to the JSON file with the languages.
+    """
+    with open(json_path) as f:
+        return {lang["lang_code"]: lang for lang in json.load(f)}
+
+
+@lru_cache(maxsize=None)
+def load_voices(json_path: str = "data/voices.json") -> List[Dict[str, str]]:
+    """
+    Load the accepted Edge TTS voices. The result is cached by path.
+
+    Args:
+        json_path (str): Path to the JSON file with the voices.
+    """
+    with open(json_path) as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def index_voices_by_language(
+    json_path: str = "data/voices.json",
+) -> Dict[str, List[str]]:
+    """
+    Index the names of the accepted voices by their language code (e.g. "en").
+    The result is cached by path.
+
+    Args:
+        json_path (str): Path to the JSON file with the voices.
+    """
+    index = {}
+    for voice in load_voices(json_path):
+        index.setdefault(voice["Name"].split("-")[0], []).append(voice["Name"])
+    return index
+
+
+def download_media_files(media_files: List[MediaFile], max_workers: int = 8) -> None:
+    """
+    Download several media files concurrently. The downloads are network bound, so they
+    run in threads. Each download checks if its file already exists before downloading.
+
+    Args:
+        media_files (List[MediaFile]): Media files to download.
+        max_workers (int): Maximum number of downloads at the same time.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results to raise any error of the downloads
+        list(executor.map(MediaFile.download, media_files))
+
+
+def filter_media_files(json_path: str, **conditions: Any) -> List[MediaFile]:
+    """
+    Get the media files of a JSON file matching all the given field values.
+
+    Args:
+        json_path (str): Path to the JSON file with the media files.
+        conditions: Field values to match. Example: type="background", topic="gameplay".
+    """
+    fields = tuple(sorted(conditions))
+    index = index_media_files(json_path, fields)
+    return index.get(tuple(conditions[field] for field in fields), [])
+
+
 class RedditComment(BaseModel):
     comment_id: str
     post_id: str
@@ -116,32 +277,32 @@ class RedditComment(BaseModel):
     score: int
     permalink: str
 
-    @property
+    @cached_property
     def length(self) -> int:
         return len(self.body.strip())
 
-    @property
+    @cached_property
     def image_path(self) -> str:
         return f"assets/posts/{self.post_id}/img/comment_{self.comment_id}.png"
 
-    @property
+    @cached_property
     def audio_path(self) -> str:
-        return f"assets/posts/{self.post_id}/audio/comment_{self.comment_id}.mp3"
+        return f"assets/posts/{self.post_id}/audio/comment_{self.comment_id}.wav"
 
-    @property
+    @cached_property
     def video_path(self) -> str:
         return f"assets/posts/{self.post_id}/video/comment_{self.comment_id}.mp4"
 
-    @property
+    @cached_property
     def url(self) -> str:
         return f"https://www.reddit.com{self.permalink}"
 
 
 class RedditPost(BaseModel):
 
-    supported_languages: ClassVar[List[str]] = [
-        lang["lang_code"] for lang in json.load(open("./data/languages.json"))
-    ]
+    # Keys view of the languages, for O(1) lookups that keep the file order
+    supported_languages: ClassVar[KeysView[str]] = load_languages().keys()
+    language_detection_length: ClassVar[int] = 512
 
     post_id: str
     title: str
@@ -154,33 +315,33 @@ class RedditPost(BaseModel):
     tag: Optional[str] = None
     language: Optional[str] = None
 
-    @property
+    @cached_property
     def length(self) -> int:
         return len(self.title.strip()) + len(self.body.strip())
 
-    @property
+    @cached_property
     def image_path(self) -> str:
         return f"assets/posts/{self.post_id}/img/post.png"
 
-    @property
+    @cached_property
     def audio_path(self) -> str:
-        return f"assets/posts/{self.post_id}/audio/post.mp3"
+        return f"assets/posts/{self.post_id}/audio/post.wav"
 
-    @property
+    @cached_property
     def video_path(self) -> str:
         return f"assets/posts/{self.post_id}/video/post.mp4"
 
-    @property
+    @cached_property
     def title_audio_path(self) -> str:
-        return f"assets/posts/{self.post_id}/audio/post_title.mp3"
+        return f"assets/posts/{self.post_id}/audio/post_title.wav"
 
-    @property
+    @cached_property
     def body_audio_path(self) -> str:
         if len(self.body) == 0:
             return None
-        return f"assets/posts/{self.post_id}/audio/post_body.mp3"
+        return f"assets/posts/{self.post_id}/audio/post_body.wav"
 
-    @property
+    @cached_property
     def url(self) -> str:
         return f"https://www.reddit.com{self.permalink}"
 
@@ -191,7 +352,12 @@ class RedditPost(BaseModel):
         Validate that the language is in the list of supported languages.
         """
 
-        model.language = langid.classify(model.title + " " + model.body)[0]
+        # Imported here, as it is only needed when parsing posts
+        import langid
+
+        # A few hundred characters are enough to detect the language of a post
+        text = model.title + " " + model.body
+        model.language = langid.classify(text[: cls.language_detection_length])[0]
 
         if model.language not in cls.supported_languages:
             raise ValueError(
@@ -204,9 +370,14 @@ class RedditPost(BaseModel):
 
 
 class Speaker(BaseModel):
-    accepted_speakers: Optional[List[Dict[str, str]]] = json.load(
-        open("data/voices.json"),
-    )
+    accepted_speakers: ClassVar[List[Dict[str, Any]]] = load_voices()
+
+    # Accepted speakers indexed by name and by language, built once
+    _speakers_by_name: ClassVar[Dict[str, Dict[str, Any]]] = {
+        speaker["Name"]: speaker for speaker in accepted_speakers
+    }
+    _speakers_by_language: ClassVar[Dict[str, List[str]]] = index_voices_by_language()
+
     name: Optional[str] = None
     language: Literal["pt", "es", "en"]
 
@@ -222,11 +393,7 @@ class Speaker(BaseModel):
             value (str): The speaker name.
         """
 
-        language_speakers = [
-            speaker["Name"]
-            for speaker in model.accepted_speakers
-            if speaker["Name"].startswith(model.language)
-        ]
+        language_speakers = cls._speakers_by_language.get(model.language, [])
 
         if not model.name:
             model.name = random.choice(language_speakers)
@@ -244,21 +411,13 @@ class Speaker(BaseModel):
             )
         return model
 
-    @property
+    @cached_property
     def gender(self) -> str:
-        return next(
-            speaker["Gender"]
-            for speaker in self.accepted_speakers
-            if speaker["Name"] == self.name
-        )
+        return self._speakers_by_name[self.name]["Gender"]
 
-    @property
+    @cached_property
     def locale(self) -> str:
-        return next(
-            "-".join(speaker["Name"].split("-")[:2])
-            for speaker in self.accepted_speakers
-            if speaker["Name"] == self.name
-        )
+        return "-".join(self.name.split("-")[:2])
 
 
 class CaptionStyle(BaseModel):
@@ -287,19 +446,34 @@ class CaptionStyle(BaseModel):
     segment_level: Optional[bool] = True
     word_levels: Optional[bool] = True
 
+    # ASS numpad alignment of each natural language alignment
+    _alignments: ClassVar[Dict[str, int]] = {"bottom": 2, "middle": 5, "top": 8}
+
     @property
     def font_path(self) -> str:
         return f"assets/fonts/{self.fontname.replace(' ', '_')}"
 
+    @cached_property
+    def pysubs2_dict(self) -> Dict[str, Any]:
+        """
+        Style properties to apply to a pysubs2 style, filtering out the external properties.
+        """
+        return {key: value for key, value in self if "_" not in key}
+
     @model_validator(mode="after")
     @classmethod
     def update_color(cls, model: "CaptionStyle") -> "CaptionStyle":
         """
         Update color parameters to use pysubs2 Color class.
         """
-        for field_name, value in model.model_dump().items():
-            if "color" in field_name and isinstance(value, (list, tuple)):
-                setattr(model, field_name, Color(*value))
+        # Iterate the model directly (fields and extras) instead of serializing it
+        colors = [
+            (field_name, value)
+            for field_name, value in model
+            if "color" in field_name and isinstance(value, (list, tuple))
+        ]
+        for field_name, value in colors:
+            setattr(model, field_name, Color(*value))
 
         return model
 
@@ -309,17 +483,13 @@ class CaptionStyle(BaseModel):
         """
         Update a natural language string to a number for alignment.
         """
-        if model.alignment == "bottom":
-            model.alignment = 2
-        elif model.alignment == "middle":
-            model.alignment = 5
-        elif model.alignment == "top":
-            model.alignment = 8
-        else:
+        if model.alignment not in cls._alignments:
             raise ValueError(
                 "Invalid alignment value, must be 'bottom', 'middle' or 'top'",
             )
 
+        model.alignment = cls._alignments[model.alignment]
+
         return model
 
     model_config = {"extra": "allow"}
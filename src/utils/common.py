@@ -1,11 +1,23 @@
 # -*- coding: utf-8 -*-
+import inspect
+import os
+import random
+import threading
+import zlib
+from collections import defaultdict
+from functools import lru_cache, wraps
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Set, Tuple
 
-import torch
+import numpy as np
 from loguru import logger
 
 from src.config import settings
 
+# Prime modulus of the MinHash permutations. The shingle hashes have 32 bits, so the
+# permutations never overflow 64 bits
+_MINHASH_PRIME = (1 << 31) - 1
+
 
 def create_file_folder(file_path: str) -> None:
     """
@@ -14,21 +26,188 @@ def create_file_folder(file_path: str) -> None:
     Args:
         file_path (str): The path to the file.
     """
-    path = Path(file_path)
-    if not path.parent.exists():
-        path.parent.mkdir(parents=True, exist_ok=True)
-        logger.info(f"Folder not found. Created folder: {path.parent}")
+    # The folder almost always exists, which only costs a stat. exist_ok covers another
+    # thread creating it meanwhile, and mkdir still fails if the path is a file
+    folder = Path(file_path).parent
+    if folder.is_dir():
+        return
+    folder.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Folder not found. Created folder: {folder}")
+
+
+# Locks of the files being created by the functions decorated with skip_if_exists
+_FILE_LOCKS: Dict[str, threading.Lock] = {}
+
+
+def skip_if_exists(output_arg: str = "output_path") -> Callable:
+    """
+    Decorator for functions that create a file. The call is skipped if the file already
+    exists, otherwise the parent folder of the file is created before calling the function.
+    Concurrent calls creating the same file wait for the first one and are then skipped,
+    instead of creating the file twice.
+
+    Args:
+        output_arg (str): Name of the argument with the path of the created file.
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            output_path = bound.arguments[output_arg]
 
+            lock = _FILE_LOCKS.setdefault(
+                os.path.abspath(output_path),
+                threading.Lock(),
+            )
+            with lock:
+                if os.path.exists(output_path):
+                    logger.info(f"File already exists at: {output_path}")
+                    return None
 
+                create_file_folder(output_path)
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@lru_cache(maxsize=1)
 def get_device() -> str:
     """
-    Get the device to use for PyTorch operations.
+    Get the device to use for PyTorch operations. The device is probed once per process.
     """
     if settings.FORCE_HF_CPU:
         return "cpu"
-    elif torch.cuda.is_available():
+
+    # Import torch here, so the modules using the other helpers don't pay its import time
+    import torch
+
+    if torch.cuda.is_available():
         return "cuda"
     elif torch.backends.mps.is_available():
         return "mps"
     else:
         return "cpu"
+
+
+def get_random_time_range(
+    input_duration: float,
+    duration: float,
+    margin: int = 0,
+) -> Tuple[float, float]:
+    """
+    Choose a random (start, end) range of the given duration inside a media file.
+
+    Args:
+        input_duration (float): Duration of the input media file in seconds.
+        duration (float): Desired duration of the range in seconds.
+        margin (int): Seconds to avoid at the start and end of the input (e.g. intros/outros).
+            It is ignored if the input is shorter than twice the margin.
+    """
+    input_duration = int(input_duration)
+    use_margin = margin > 0 and input_duration > (margin * 2)
+    min_start = margin if use_margin else 0
+    max_end = input_duration - margin if use_margin else input_duration
+
+    if max_end - min_start < duration:
+        # If the valid range is too short, use the full range
+        logger.info(
+            f"Input too short for a {duration}s range. Using {min_start}s to {max_end}s.",
+        )
+        return min_start, max_end
+
+    start_time = random.randint(min_start, int(max_end - duration))
+    return start_time, start_time + duration
+
+
+def get_shingles(text: str, size: int = 5) -> Set[str]:
+    """
+    Get the set of character n-grams (shingles) of a text, ignoring case and extra spaces.
+
+    Args:
+        text (str): The input text.
+        size (int): The number of characters of each shingle.
+    """
+    text = " ".join(text.lower().split())
+    if len(text) <= size:
+        return {text}
+    return {text[i : i + size] for i in range(len(text) - size + 1)}  # noqa: E203
+
+
+def group_similar_texts(
+    texts: List[str],
+    threshold: float = 0.3,
+    size: int = 5,
+    num_perm: int = 64,
+) -> List[List[int]]:
+    """
+    Group the indexes of texts whose character shingles have a Jaccard similarity above
+    the threshold. The candidate pairs come from MinHash signatures bucketed by band
+    (locality-sensitive hashing), and only they are compared with the exact similarity.
+    Unlike comparing every pair of texts sharing a shingle, common shingles like " the "
+    do not make it quadratic in the number of texts.
+
+    Args:
+        texts (List[str]): The input texts.
+        threshold (float): Minimum Jaccard similarity to put two texts in the same group.
+        size (int): The number of characters of each shingle.
+        num_perm (int): The number of hash permutations of the MinHash signatures.
+    """
+    shingles = [get_shingles(text, size) for text in texts]
+
+    # Use the most rows per band whose LSH threshold, (1 / bands) ** (1 / rows), is still
+    # below the requested one, so that similar pairs are rarely missed
+    rows = max(
+        (
+            r
+            for r in range(1, num_perm + 1)
+            if num_perm % r == 0 and (r / num_perm) ** (1 / r) <= threshold
+        ),
+        default=1,
+    )
+
+    # MinHash signature: the minimum of each random hash permutation over the shingles
+    rng = np.random.default_rng(0)
+    a = rng.integers(1, _MINHASH_PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, _MINHASH_PRIME, num_perm, dtype=np.uint64)
+    buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+    for i, text_shingles in enumerate(shingles):
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode()) for shingle in text_shingles),
+            dtype=np.uint64,
+            count=len(text_shingles),
+        )
+        signature = ((np.outer(hashes, a) + b) % _MINHASH_PRIME).min(axis=0)
+        for band, band_signature in enumerate(signature.reshape(-1, rows)):
+            buckets[(band, band_signature.tobytes())].append(i)
+
+    # Union-find over the pairs above the threshold
+    parent = list(range(len(texts)))
+
+    def _find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Texts sharing a band are candidates, checked with their exact Jaccard similarity
+    for ids in buckets.values():
+        for x, i in enumerate(ids):
+            for j in ids[x + 1 :]:  # noqa: E203
+                if _find(i) == _find(j):
+                    continue
+                intersection = len(shingles[i] & shingles[j])
+                union = len(shingles[i]) + len(shingles[j]) - intersection
+                if intersection / union >= threshold:
+                    parent[_find(j)] = _find(i)
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(texts)):
+        groups[_find(i)].append(i)
+
+    return list(groups.values())
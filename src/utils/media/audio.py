@@ -1,33 +1,13 @@
 # -*- coding: utf-8 -*-
-import os
-import random
-from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import ffmpeg
 from loguru import logger
 
 from src.config import settings
-from src.utils.common import create_file_folder
-
-
-def generate_silence(duration: float, output_path: str) -> None:
-    """
-    Generate a silent MP3 file of given duration in seconds.
-
-    Args:
-        duration (int): Duration of silence in seconds.
-        output_path (str): Path to save the silent MP
-    """
-
-    # Create the output folder if it doesn't exist
-    create_file_folder(output_path)
-
-    ffmpeg.input("anullsrc=r=44100:cl=stereo", f="lavfi").output(
-        output_path,
-        t=duration,
-        loglevel="quiet",
-    ).run(overwrite_output=True)
+from src.utils.common import get_random_time_range, skip_if_exists
+from src.utils.media.jobs import ffmpeg_job, run_ffmpeg
+from src.utils.media.probe import probe_media
 
 
 def get_audio_duration(file_path: str, round_value: bool = True) -> float:
@@ -38,58 +18,70 @@ def get_audio_duration(file_path: str, round_value: bool = True) -> float:
         file_path (str): Path to the MP3 file.
         round_value (bool): Whether to round the duration to the nearest second.
     """
-    probe = ffmpeg.probe(file_path)
-    duration = float(probe["format"]["duration"])
+    duration = float(probe_media(file_path)["format"]["duration"])
     return round(duration, 2) if round_value else duration
 
 
+@skip_if_exists("output_file")
+@ffmpeg_job
 def concatenate_audio_files(
     files: List[str],
     silence_duration: float = 0.2,
     output_file: str = "result.mp3",
+    durations: Optional[List[float]] = None,
 ) -> None:
     """
-    Concatenates multiple MP3 files with silence between them.
+    Concatenates multiple MP3 files with silence between them. The audio stream of video
+    files can also be concatenated.
 
     Args:
         files (list): List of MP3 files to concatenate.
         silence_duration (float): Duration of silence in seconds between each file.
+            Put 0 to disable.
         output_file (str): Name of the output file.
+        durations (List[float], optional): Duration of each file in the output. The audios
+            are padded with silence or trimmed to it, e.g. to match the video durations
+            of video files, whose audio can be a bit shorter or longer.
     """
 
-    # check if file exists
-    if os.path.exists(output_file):
-        logger.info(f"Audio file already exists at: {output_file}")
-        return
-
-    # Create output folder if it doesn't exist
-    create_file_folder(output_file)
-
-    # Generate silence file
-    silence_path = str(Path(settings.TEMP_PATH) / "silence.mp3")
-    generate_silence(silence_duration, silence_path)
-
-    # Create a list of input files alternating between audio and silence
+    # Create a list of input files alternating between audio and silence.
+    # The silence is generated in the same graph, so no temporary file is needed
     inputs = []
     for i, mp3 in enumerate(files):
-        inputs.append(ffmpeg.input(mp3))
-        if i < len(files) - 1:  # Avoid adding silence at the end
-            inputs.append(ffmpeg.input(silence_path))
+        # concat needs the same sample format in every segment, match the silence one
+        audio = ffmpeg.input(mp3).audio.filter(
+            "aformat",
+            sample_rates=44100,
+            channel_layouts="stereo",
+        )
+        if durations:
+            audio = audio.filter("apad").filter("atrim", duration=durations[i])
+        inputs.append(audio)
+        # Avoid adding silence at the end
+        if silence_duration > 0 and i < len(files) - 1:
+            inputs.append(
+                ffmpeg.input(
+                    "anullsrc=r=44100:cl=stereo",
+                    f="lavfi",
+                    t=silence_duration,
+                ).audio,
+            )
 
     # Concatenate the inputs
     try:
-        ffmpeg.concat(*inputs, v=0, a=1).output(output_file, loglevel="quiet").run(
-            overwrite_output=True,
+        run_ffmpeg(
+            ffmpeg.concat(*inputs, v=0, a=1)
+            .output(output_file, loglevel="quiet")
+            .overwrite_output(),
         )
         logger.info(f"Audio files concatenated to {output_file}")
     except ffmpeg.Error as e:
         logger.error(f"ffmpeg error: {e.stderr.decode('utf8')}")
         raise e
-    finally:
-        # Cleanup temporary silence file
-        os.remove(silence_path)
 
 
+@skip_if_exists()
+@ffmpeg_job
 def cut_audio(
     input_path: str,
     output_path: str,
@@ -110,29 +102,12 @@ def cut_audio(
         fade_duration (int): Duration of fade-in and fade-out effects in seconds. Put 0 to disable.
     """
 
-    # check if file exists
-    if os.path.exists(output_path):
-        logger.info(f"Audio file already exists at: {output_path}")
-        return
-
     try:
-        # Create output folder if it doesn't exist
-        create_file_folder(output_path)
-
-        input_duration = int(get_audio_duration(input_path))
-
         if not start_time or not end_time:
-
-            if input_duration < duration:
-                start_time = 0
-                end_time = input_duration
-                logger.info(
-                    f"Audio duration is less than {duration}s. Keeping the full audio.",
-                )
-
-            else:
-                start_time = random.randint(0, int(input_duration) - int(duration))
-                end_time = start_time + duration
+            start_time, end_time = get_random_time_range(
+                get_audio_duration(input_path),
+                duration,
+            )
 
         # To get if the audio is shorter than the duration
         output_duration = end_time - start_time
@@ -140,6 +115,7 @@ def cut_audio(
         # Start the FFmpeg processing
         filter_chain = ffmpeg.input(input_path, ss=start_time, t=output_duration)
 
+        fade = 0
         if fade_duration > 0:
             fade = min(
                 fade_duration,
@@ -157,16 +133,19 @@ def cut_audio(
                 duration=fade,
             )
 
-        (
+        if fade_duration <= 0 and input_path.lower().endswith(".mp3"):
+            # Without fades the MP3 frames can be copied, skipping the decode and encode
+            output_args = {"acodec": "copy"}
+        else:
+            output_args = {"acodec": "libmp3lame", "qscale": 2}
+
+        run_ffmpeg(
             filter_chain.output(
                 output_path,
                 format="mp3",
-                acodec="libmp3lame",
-                qscale=2,
                 loglevel="quiet",
-            )
-            .overwrite_output()
-            .run()
+                **output_args,
+            ).overwrite_output(),
         )
 
         logger.info(
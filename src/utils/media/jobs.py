@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Optional
+
+import ffmpeg
+
+from src.config import settings
+
+# Slots shared by every ffmpeg job of the process, so concurrent callers queue instead of
+# running more encodes than cores
+FFMPEG_JOBS = threading.BoundedSemaphore(settings.FFMPEG_MAX_JOBS)
+
+
+def ffmpeg_job(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorator to run a function holding one of the FFMPEG_JOBS slots. It must only wrap
+    functions that do not call other decorated functions, otherwise they could deadlock.
+
+    Args:
+        func (Callable): Function that runs ffmpeg.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> Any:
+        with FFMPEG_JOBS:
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def run_ffmpeg(
+    stream: ffmpeg.nodes.OutputStream,
+    max_chunks: int = 16,
+    input: Optional[bytes] = None,
+) -> bytes:
+    """
+    Run an ffmpeg command reading its log while it runs, so ffmpeg never blocks writing
+    to a full pipe. Only the last chunks of the log are kept in memory.
+
+    Args:
+        stream (ffmpeg.nodes.OutputStream): Output stream of the command to run.
+        max_chunks (int): Number of 64 KB log chunks to keep. Default is 16 (1 MB).
+        input (bytes): Data written to the stdin of ffmpeg (read with "pipe:"). It must be
+            small, since it is written before reading the log.
+
+    Returns:
+        bytes: The end of the ffmpeg log.
+
+    Raises:
+        ffmpeg.Error: If ffmpeg exits with an error, with the end of the log as stderr.
+    """
+    process = stream.run_async(pipe_stdin=input is not None, pipe_stderr=True)
+    if input is not None:
+        process.stdin.write(input)
+        process.stdin.close()
+
+    log = deque(iter(lambda: process.stderr.read(65536), b""), maxlen=max_chunks)
+    process.wait()
+
+    stderr = b"".join(log)
+    if process.returncode:
+        raise ffmpeg.Error("ffmpeg", None, stderr)
+    return stderr
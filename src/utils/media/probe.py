@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import tempfile
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+import ffmpeg
+
+from src.config import settings
+from src.utils.common import create_file_folder
+
+
+def probe_media(file_path: str, **kwargs: str) -> Dict[str, Any]:
+    """
+    Get the ffprobe metadata of a media file. The result is cached in memory and on disk,
+    keyed by the file path, modification time, size and ffprobe arguments, so a file is
+    only probed again when it changes.
+
+    Args:
+        file_path (str): Path to the media file.
+        **kwargs: Extra ffprobe arguments (e.g. select_streams="v:0").
+    """
+    stat = os.stat(file_path)
+    return _probe_media(
+        os.path.abspath(file_path),
+        stat.st_mtime_ns,
+        stat.st_size,
+        tuple(sorted(kwargs.items())),
+    )
+
+
+def get_keyframe_before(file_path: str, timestamp: float) -> float:
+    """
+    Get the timestamp of the last video keyframe at or before the given timestamp.
+    Cutting at a keyframe allows copying the streams instead of re-encoding them.
+
+    Args:
+        file_path (str): Path to the video file.
+        timestamp (float): Timestamp in seconds.
+    """
+    keyframes = _get_keyframes(file_path)
+    idx = bisect_right(keyframes, timestamp)
+    return keyframes[idx - 1] if idx else 0.0
+
+
+def _get_keyframes(file_path: str) -> Tuple[float, ...]:
+    """
+    Get the sorted timestamps of the keyframes of the first video stream.
+
+    Args:
+        file_path (str): Path to the video file.
+    """
+    probe = probe_media(
+        file_path,
+        select_streams="v:0",
+        skip_frame="nokey",
+        show_frames=None,
+        show_entries="frame=pts_time",
+    )
+    return tuple(
+        sorted(
+            float(frame["pts_time"]) for frame in probe["frames"] if "pts_time" in frame
+        ),
+    )
+
+
+@lru_cache(maxsize=512)
+def _probe_media(
+    file_path: str,
+    mtime_ns: int,
+    size: int,
+    probe_args: Tuple[Tuple[str, str], ...] = (),
+) -> Dict[str, Any]:
+    """
+    Probe a media file, reusing the metadata stored in PROBE_CACHE_PATH if available.
+
+    Args:
+        file_path (str): Absolute path to the media file.
+        mtime_ns (int): Modification time of the file in nanoseconds.
+        size (int): Size of the file in bytes.
+        probe_args (Tuple[Tuple[str, str], ...]): Extra ffprobe arguments.
+    """
+    key = hashlib.sha256(
+        f"{file_path}|{mtime_ns}|{size}|{probe_args}".encode(),
+    ).hexdigest()
+    cache_path = os.path.join(settings.PROBE_CACHE_PATH, f"{key}.json")
+
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    probe = ffmpeg.probe(file_path, **dict(probe_args))
+
+    # Write to a temporary file and rename it, so readers never see a partial file
+    create_file_folder(cache_path)
+    with tempfile.NamedTemporaryFile(
+        "w",
+        suffix=".json",
+        dir=settings.PROBE_CACHE_PATH,
+        delete=False,
+    ) as tmp_file:
+        json.dump(probe, tmp_file)
+    os.replace(tmp_file.name, cache_path)
+
+    return probe
@@ -1,25 +1,50 @@
 # -*- coding: utf-8 -*-
+import json
 import os
-import random
+import platform
+import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Literal
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 
 import ffmpeg
 import pysubs2
 from loguru import logger
-from moviepy.editor import (
-    AudioFileClip,
-    ColorClip,
-    CompositeVideoClip,
-    VideoFileClip,
-    concatenate_videoclips,
-    vfx,
-)
 
 from src.config import settings
-from src.utils.common import create_file_folder
+from src.utils.common import create_file_folder, get_random_time_range, skip_if_exists
 from src.utils.media.audio import get_audio_duration
+from src.utils.media.jobs import FFMPEG_JOBS, ffmpeg_job, run_ffmpeg
+from src.utils.media.probe import get_keyframe_before, probe_media
+
+# GPU decoding and scaling used with each hardware encoder
+_HWACCELS = {
+    "h264_videotoolbox": {
+        "hwaccel": "videotoolbox",
+        "output_format": "videotoolbox_vld",
+        "scale_filter": "scale_vt",
+    },
+    "h264_nvenc": {
+        "hwaccel": "cuda",
+        "output_format": "cuda",
+        "scale_filter": "scale_cuda",
+    },
+}
+
+# Whether the GPU decode and scale chain works, by codec and pixel format
+_GPU_SCALE_SUPPORT: Dict[Tuple[Optional[str], Optional[str]], bool] = {}
+
+# Map the libx264 presets to the NVENC ones (p1 is the fastest, p7 the slowest)
+_NVENC_PRESETS = {
+    "veryslow": "p7",
+    "slow": "p5",
+    "medium": "p4",
+    "fast": "p3",
+    "veryfast": "p1",
+}
 
 
 def get_video_duration(file_path: str) -> float:
@@ -29,10 +54,250 @@ def get_video_duration(file_path: str) -> float:
     Args:
         file_path (str): Path to the video file.
     """
-    probe = ffmpeg.probe(file_path)
-    return float(probe["format"]["duration"])
+    return float(probe_media(file_path)["format"]["duration"])
 
 
+def get_video_durations(file_paths: List[str], max_workers: int = 8) -> List[float]:
+    """
+    Returns the durations of several video files in seconds, in the same order. The files
+    not probed yet are probed in parallel, since each probe waits on an ffprobe process.
+
+    Args:
+        file_paths (List[str]): Paths to the video files.
+        max_workers (int): Maximum number of probes running at the same time.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(get_video_duration, file_paths))
+
+
+def get_video_resolution(file_path: str) -> Tuple[int, int]:
+    """
+    Returns the (width, height) of the first video stream of a video file.
+
+    Args:
+        file_path (str): Path to the video file.
+    """
+    stream = next(
+        stream
+        for stream in probe_media(file_path)["streams"]
+        if stream["codec_type"] == "video"
+    )
+    return int(stream["width"]), int(stream["height"])
+
+
+def has_audio_stream(file_path: str) -> bool:
+    """
+    Check if a media file contains at least one audio stream.
+
+    Args:
+        file_path (str): Path to the media file.
+    """
+    streams = probe_media(file_path)["streams"]
+    return any(stream["codec_type"] == "audio" for stream in streams)
+
+
+@lru_cache(maxsize=1)
+def get_h264_encoder() -> str:
+    """
+    Get the fastest H.264 encoder that works on the system: NVENC (NVIDIA), VideoToolbox
+    (macOS) or libx264 (CPU). The hardware encoders are tested with a short encode, since
+    ffmpeg lists them even if there is no device to run them. Only libx264 is used if
+    USE_GPU is disabled.
+    """
+
+    if settings.USE_GPU:
+        for encoder in ("h264_nvenc", "h264_videotoolbox"):
+            result = subprocess.run(
+                [
+                    "ffmpeg",
+                    "-hide_banner",
+                    "-loglevel",
+                    "error",
+                    "-f",
+                    "lavfi",
+                    "-i",
+                    "nullsrc=s=256x256:d=0.1",
+                    "-c:v",
+                    encoder,
+                    "-f",
+                    "null",
+                    "-",
+                ],
+                capture_output=True,
+            )
+            if result.returncode == 0:
+                logger.info(f"Using the {encoder} hardware encoder.")
+                return encoder
+
+    return "libx264"
+
+
+def get_hwaccel() -> Optional[Dict[str, str]]:
+    """
+    Get the GPU decoding and scaling settings of the hardware encoder, or None if
+    USE_GPU_DECODE is disabled or the encoder runs on the CPU.
+    """
+
+    if not settings.USE_GPU_DECODE:
+        return None
+    return _HWACCELS.get(get_h264_encoder())
+
+
+def can_scale_on_gpu(file_path: str) -> bool:
+    """
+    Check if a video can be decoded, scaled and downloaded as nv12 frames on the GPU. The
+    chain can fail even if the encoder works: the GPU may not decode the codec, ffmpeg may
+    be built without the GPU scale filter and 10-bit videos download as p010. The result is
+    cached by codec and pixel format, after test-running the chain on the first frame.
+
+    Args:
+        file_path (str): Path to the video file.
+    """
+
+    hwaccel = get_hwaccel()
+    if not hwaccel:
+        return False
+
+    stream = probe_media(file_path, select_streams="v:0")["streams"][0]
+    key = (stream.get("codec_name"), stream.get("pix_fmt"))
+    if key not in _GPU_SCALE_SUPPORT:
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-hwaccel",
+                hwaccel["hwaccel"],
+                "-hwaccel_output_format",
+                hwaccel["output_format"],
+                "-i",
+                file_path,
+                "-frames:v",
+                "1",
+                "-vf",
+                f"{hwaccel['scale_filter']}=256:256,hwdownload,format=nv12",
+                "-f",
+                "null",
+                "-",
+            ],
+            capture_output=True,
+        )
+        _GPU_SCALE_SUPPORT[key] = result.returncode == 0
+        if result.returncode != 0:
+            logger.info(f"Scaling {key[0]} ({key[1]}) videos on the CPU.")
+
+    return _GPU_SCALE_SUPPORT[key]
+
+
+def get_hwaccel_input_args(keep_on_gpu: bool = False) -> Dict[str, str]:
+    """
+    Get the ffmpeg input arguments to decode videos on the GPU of the hardware encoder.
+    Empty if USE_GPU_DECODE is disabled or the encoder runs on the CPU.
+
+    Args:
+        keep_on_gpu (bool): Keep the decoded frames in GPU memory, so GPU filters (e.g.
+            scale_vt) can process them without copying them back to the CPU.
+    """
+
+    hwaccel = get_hwaccel()
+    if not hwaccel:
+        return {}
+
+    input_args = {"hwaccel": hwaccel["hwaccel"]}
+    if keep_on_gpu:
+        input_args["hwaccel_output_format"] = hwaccel["output_format"]
+    return input_args
+
+
+def get_video_output_args(
+    preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
+    faststart: bool = True,
+) -> Dict[str, Union[str, int]]:
+    """
+    Get the ffmpeg H.264 video output arguments for the selected encoder. Each encoder uses
+    its own constant quality option (the CRF is ignored by the hardware encoders), except
+    VideoToolbox on Intel Macs that only supports a bitrate. The hardware encoders take
+    nv12 frames, the same 4:2:0 format as yuv420p with interleaved chroma, which avoids
+    a conversion before uploading the frames.
+
+    Args:
+        preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]): Encoding preset.
+            Default is "slow".
+        faststart (bool): Move the MP4 index to the start of the file, so the video can be
+            played before it is fully downloaded. Not needed for intermediate files.
+    """
+
+    encoder = get_h264_encoder()
+    if encoder == "h264_videotoolbox":
+        output_args = {
+            "c:v": encoder,
+            "pix_fmt": "nv12",
+            "realtime": 0,
+            "allow_sw": 1,
+        }
+        # The constant quality mode is only available on Apple Silicon
+        if platform.machine() == "arm64":
+            output_args["q:v"] = 65
+        else:
+            output_args["b:v"] = "5000k"
+    elif encoder == "h264_nvenc":
+        # Constant quality VBR, the equivalent of the libx264 CRF
+        output_args = {
+            "c:v": encoder,
+            "pix_fmt": "nv12",
+            "preset": _NVENC_PRESETS[preset],
+            "rc": "vbr",
+            "cq": 19,
+            "b:v": 0,
+        }
+    else:
+        output_args = {
+            "c:v": "libx264",
+            "pix_fmt": "yuv420p",
+            "preset": preset,
+            "crf": 18,
+            "threads": settings.FFMPEG_THREADS,
+        }
+
+    if faststart:
+        output_args["movflags"] = "+faststart"
+    return output_args
+
+
+def get_still_image_video_args(
+    preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
+) -> Dict[str, Union[str, int]]:
+    """
+    Get the ffmpeg video output arguments to encode a still image. The image is read at 1 fps
+    and written at 30 fps with a long GOP, so the duplicated frames are almost free to encode.
+    The output stops with the shortest stream, so the audio duration needs no probing.
+
+    Args:
+        preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]): Encoding preset.
+            Default is "slow".
+    """
+
+    output_args = {**get_video_output_args(preset), "r": 30, "g": 300, "shortest": None}
+    if get_h264_encoder() == "libx264":
+        output_args["tune"] = "stillimage"
+        output_args["x264-params"] = "keyint=300:min-keyint=300:scenecut=0"
+    return output_args
+
+
+def get_filter_thread_args() -> List[str]:
+    """
+    Get the ffmpeg global arguments to run the filter graphs with FFMPEG_THREADS threads.
+    By default the filters of a graph run in a single thread, which bottlenecks the scale,
+    pad and overlay filters before the encoder.
+    """
+
+    threads = str(settings.FFMPEG_THREADS)
+    return ["-filter_threads", threads, "-filter_complex_threads", threads]
+
+
+@skip_if_exists()
+@ffmpeg_job
 def create_image_videoclip(
     image_path: str,
     audio_path: str,
@@ -50,38 +315,89 @@ def create_image_videoclip(
             Default is "slow".
     """
 
-    # Check if the video already exists
-    if os.path.exists(output_path):
-        logger.info(f"Video already exists at: {output_path}")
-        return
-
     try:
-        # Create the parent folder of the output path if it doesn't exist
-        create_file_folder(output_path)
-
-        input_image = ffmpeg.input(image_path, loop=1, framerate=60)
+        input_image = ffmpeg.input(image_path, loop=1, framerate=1)
         input_audio = ffmpeg.input(audio_path)
 
         output_args = {
-            "c:v": "h264_videotoolbox" if settings.USE_GPU else "libx264",
+            **get_still_image_video_args(preset),
             "c:a": "aac",
-            "t": get_audio_duration(audio_path),
-            "pix_fmt": "yuv420p",
-            "preset": preset,
-            "crf": 18,
-            "b:v": "5000k" if settings.USE_GPU else "3000k",
             "b:a": "256k",
         }
-        (
+        run_ffmpeg(
             ffmpeg.output(
                 input_image,
                 input_audio,
                 output_path,
                 loglevel="quiet",
                 **output_args,
+            ).overwrite_output(),
+        )
+
+        logger.info(f"Video created at: {output_path}")
+
+    except ffmpeg.Error as e:
+        logger.error(f"FFmpeg error: {e.stderr.decode('utf8')}")
+
+
+@skip_if_exists()
+@ffmpeg_job
+def create_image_videoclip_concat(
+    image_path: str,
+    audio_paths: List[str],
+    output_path: str,
+    silence_duration: float = 0.2,
+    preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
+) -> None:
+    """
+    Combine an image and several audio files into an MP4 video, concatenating the audios
+    with silence between them in the same ffmpeg call (no intermediate audio file).
+
+    Args:
+        image_path (str): Path to the image file.
+        audio_paths (List[str]): Paths to the audio files to concatenate.
+        output_path (str): Path to save the output video.
+        silence_duration (float): Duration of silence in seconds between each audio.
+            Put 0 to disable.
+        preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]): Encoding preset.
+            Default is "slow".
+    """
+
+    try:
+        input_image = ffmpeg.input(image_path, loop=1, framerate=1)
+
+        # Alternate audios and silences, avoiding silence at the end
+        audio_streams = []
+        for i, audio_path in enumerate(audio_paths):
+            audio_streams.append(
+                ffmpeg.input(audio_path).audio.filter(
+                    "aformat",
+                    sample_rates=44100,
+                    channel_layouts="stereo",
+                ),
             )
-            .overwrite_output()
-            .run()
+            if silence_duration > 0 and i < len(audio_paths) - 1:
+                audio_streams.append(
+                    ffmpeg.input(
+                        "anullsrc=r=44100:cl=stereo",
+                        f="lavfi",
+                        t=silence_duration,
+                    ).audio,
+                )
+
+        output_args = {
+            **get_still_image_video_args(preset),
+            "c:a": "aac",
+            "b:a": "256k",
+        }
+        run_ffmpeg(
+            ffmpeg.output(
+                input_image,
+                ffmpeg.concat(*audio_streams, v=0, a=1),
+                output_path,
+                loglevel="quiet",
+                **output_args,
+            ).overwrite_output(),
         )
 
         logger.info(f"Video created at: {output_path}")
@@ -90,73 +406,242 @@ def create_image_videoclip(
         logger.error(f"FFmpeg error: {e.stderr.decode('utf8')}")
 
 
+@ffmpeg_job
+def measure_loudness(
+    file_path: str,
+    integrated: float = -16,
+    true_peak: float = -1.5,
+    loudness_range: float = 11,
+) -> Dict[str, str]:
+    """
+    Measure the loudness of the audio of a media file with a first loudnorm pass.
+    The result can be passed to a second loudnorm pass to normalize the audio linearly.
+
+    Args:
+        file_path (str): Path to the media file.
+        integrated (float): Target integrated loudness.
+        true_peak (float): Target maximum true peak.
+        loudness_range (float): Target loudness range.
+    """
+    stderr = run_ffmpeg(
+        ffmpeg.input(file_path)
+        .audio.filter(
+            "loudnorm",
+            i=integrated,
+            tp=true_peak,
+            LRA=loudness_range,
+            print_format="json",
+        )
+        .output("-", format="null"),
+    )
+
+    # loudnorm prints its measurements as the last JSON object of the log
+    log = stderr.decode("utf8")
+    start, end = log.rindex("{"), log.rindex("}") + 1
+    return json.loads(log[start:end])
+
+
+@skip_if_exists()
 def concatenate_videos(
     video_paths: List[str],
     output_path: str,
     preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
+    max_workers: Optional[int] = None,
+    normalize_audio: bool = True,
 ) -> None:
     """
-    Concatenate videos while normalizing only the audio (leaving video untouched).
+    Concatenate videos while normalizing only the audio.
 
-    Each video's audio is resampled to 48kHz and normalized using the loudnorm filter.
-    The video stream is copied without modification. The temporary files are then concatenated
-    using FFmpeg's concat demuxer.
+    Each video's audio is resampled to 48kHz and normalized with a two pass loudnorm:
+    the loudness is measured first, and then normalized linearly with the measured values.
+    If all the videos share the same video format, the videos are read with FFmpeg's concat
+    demuxer and their streams are copied without modification, while the normalized audios
+    are joined with the concat filter. Otherwise, the videos are concatenated with the concat
+    filter and encoded once. Both run in a single FFmpeg call, without temporary files.
 
     Args:
         video_paths (List[str]): List of video file paths to concatenate.
         output_path (str): Path to save the resulting concatenated video.
         preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]):
-            Encoding preset for audio processing.
+            Encoding preset, only used if the videos must be re-encoded.
+        max_workers (int): Maximum number of loudness measurements running at the same time.
+        normalize_audio (bool): Whether to normalize the loudness of the audios. If False and
+            all the videos share the same video and audio formats, the audio streams are
+            copied too.
     """
 
-    if os.path.exists(output_path):
-        logger.info(f"Video already exists at: {output_path}")
-        return
+    # The concat demuxer can only copy the streams if they share the same format
+    video_formats, audio_formats = set(), set()
+    for path in video_paths:
+        streams = probe_media(path)["streams"]
+        video_stream = next(
+            stream for stream in streams if stream["codec_type"] == "video"
+        )
+        audio_stream = next(
+            (stream for stream in streams if stream["codec_type"] == "audio"),
+            {},
+        )
+        video_formats.add(
+            tuple(
+                video_stream.get(key)
+                for key in (
+                    "codec_name",
+                    "width",
+                    "height",
+                    "pix_fmt",
+                    "r_frame_rate",
+                    "time_base",
+                )
+            ),
+        )
+        audio_formats.add(
+            tuple(
+                audio_stream.get(key)
+                for key in ("codec_name", "sample_rate", "channels")
+            ),
+        )
 
-    temp_paths = []
-    list_file = "concat_list.txt"
-    try:
-        # Step 1: Process each video by normalizing only the audio and copying the video stream
-        for idx, path in enumerate(video_paths):
-            temp_output = str(Path(settings.TEMP_PATH) / f"temp_normalized_{idx}.mp4")
-            stream = ffmpeg.input(path)
-            # Leave video unchanged by copying it
-            video_stream = stream.video
-            # Normalize audio: resample to 48kHz and apply loudness normalization
-            audio_stream = stream.audio.filter("aresample", 48000).filter(
+    def _normalize_audio(stream: ffmpeg.Stream, path: str) -> ffmpeg.Stream:
+        if not normalize_audio:
+            return stream.filter("aresample", 48000).filter(
+                "aformat",
+                channel_layouts="stereo",
+            )
+
+        # Linear loudness normalization with the measured values, then resample to
+        # 48kHz stereo (loudnorm works at 192kHz internally)
+        loudness = measure_loudness(path)
+        return (
+            stream.filter(
                 "loudnorm",
                 i=-16,
                 tp=-1.5,
                 LRA=11,
+                measured_I=loudness["input_i"],
+                measured_TP=loudness["input_tp"],
+                measured_LRA=loudness["input_lra"],
+                measured_thresh=loudness["input_thresh"],
+                offset=loudness["target_offset"],
+                linear="true",
             )
-            ffmpeg.output(
-                video_stream,
-                audio_stream,
-                temp_output,
+            .filter("aresample", 48000)
+            .filter("aformat", channel_layouts="stereo")
+        )
+
+    if len(video_formats) > 1:
+        logger.info("Videos have different formats. Re-encoding them to concatenate.")
+        try:
+            # Measure the loudness of the videos in parallel while the graph is built
+            inputs = [ffmpeg.input(path) for path in video_paths]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                audio_streams = list(
+                    executor.map(
+                        _normalize_audio,
+                        [stream.audio for stream in inputs],
+                        video_paths,
+                    ),
+                )
+
+            # The concat filter needs the same resolution and aspect ratio in every segment.
+            # The videos are fitted without stretching and padded to the largest size, at the
+            # highest frame rate of the inputs
+            width = max(video_format[1] for video_format in video_formats)
+            height = max(video_format[2] for video_format in video_formats)
+            frame_rate = max(
+                Fraction(video_format[4]) for video_format in video_formats
+            )
+            segments = []
+            for stream, audio_stream in zip(inputs, audio_streams):
+                segments.append(
+                    stream.video.filter(
+                        "scale",
+                        width,
+                        height,
+                        force_original_aspect_ratio="decrease",
+                    )
+                    .filter("pad", width, height, "(ow-iw)/2", "(oh-ih)/2")
+                    .filter("setsar", 1)
+                    .filter("fps", str(frame_rate)),
+                )
+                segments.append(audio_stream)
+
+            concat = ffmpeg.concat(*segments, v=1, a=1).node
+            with FFMPEG_JOBS:
+                run_ffmpeg(
+                    ffmpeg.output(
+                        concat[0],
+                        concat[1],
+                        output_path,
+                        **{
+                            **get_video_output_args(preset),
+                            "c:a": "aac",
+                            "b:a": "256k",
+                        },
+                    )
+                    .global_args(*get_filter_thread_args())
+                    .overwrite_output(),
+                )
+
+            logger.info(f"Videos concatenated at: {output_path}")
+
+        except ffmpeg.Error as e:
+            error_message = e.stderr.decode("utf8") if e.stderr else str(e)
+            logger.error(f"FFmpeg error: {error_message}")
+
+        return
+
+    def _build_audio(path: str) -> ffmpeg.Stream:
+        # Pad or trim each audio to the duration of its video, which is where the concat
+        # demuxer starts the next video, so the audios stay in sync
+        return (
+            _normalize_audio(ffmpeg.input(path).audio, path)
+            .filter("apad")
+            .filter("atrim", duration=get_video_duration(path))
+        )
+
+    try:
+        # Step 1: Build the concat list, escaping the quotes of the paths
+        concat_list = "".join(
+            "file '{}'\n".format(os.path.abspath(path).replace("'", "'\\''"))
+            for path in video_paths
+        )
+
+        # Step 2: Read the videos with the concat demuxer, copying the video streams to avoid
+        # re-encoding. The list is read from stdin, so no list file is written
+        videos = ffmpeg.input(
+            "pipe:",
+            format="concat",
+            safe=0,
+            protocol_whitelist="file,pipe",
+            fflags="+genpts",
+        )
+        if not normalize_audio and len(audio_formats) == 1:
+            # The original files can be concatenated as they are
+            output = videos.output(
+                output_path,
+                **{"c": "copy", "movflags": "+faststart"},
+            )
+        else:
+            # Normalize the audios in the same ffmpeg call, joining them with the concat filter.
+            # The loudness of the videos is measured in parallel while the graph is built
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                audio_streams = list(executor.map(_build_audio, video_paths))
+
+            output = ffmpeg.output(
+                videos.video,
+                ffmpeg.concat(*audio_streams, v=0, a=1),
+                output_path,
                 **{
-                    "vcodec": "h264_videotoolbox" if settings.USE_GPU else "libx264",
                     "c:v": "copy",
-                    "acodec": "aac",
-                    "crf": 18,
-                    "b:v": "5000k" if settings.USE_GPU else "3000k",
+                    "c:a": "aac",
                     "b:a": "256k",
-                    "avoid_negative_ts": "make_zero",
-                    "preset": preset,
+                    "movflags": "+faststart",
                 },
-            ).overwrite_output().run()
-            temp_paths.append(temp_output)
+            )
 
-        # Step 2: Create the concat list file
-        with open(list_file, "w") as f:
-            for temp_path in temp_paths:
-                abs_path = os.path.abspath(temp_path)
-                f.write(f"file '{abs_path}'\n")
-
-        # Step 3: Concatenate the videos using demuxer, copying streams to avoid re-encoding
-        ffmpeg.input(list_file, format="concat", safe=0).output(
-            output_path,
-            **{"c": "copy"},
-        ).overwrite_output().run()
+        # Step 3: Concatenate the videos in a single ffmpeg call
+        with FFMPEG_JOBS:
+            run_ffmpeg(output.overwrite_output(), input=concat_list.encode())
 
         logger.info(f"Videos concatenated at: {output_path}")
 
@@ -164,15 +649,9 @@ def concatenate_videos(
         error_message = e.stderr.decode("utf8") if e.stderr else str(e)
         logger.error(f"FFmpeg error: {error_message}")
 
-    finally:
-        # Cleanup temporary files
-        if os.path.exists(list_file):
-            os.remove(list_file)
-        for temp_path in temp_paths:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-
 
+@skip_if_exists()
+@ffmpeg_job
 def cut_video(
     input_path: str,
     output_path: str,
@@ -181,6 +660,7 @@ def cut_video(
     duration: float = settings.MIN_VIDEO_DURATION,
     transition_duration: int = 30,
     preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
+    frame_accurate: bool = False,
 ) -> None:
     """
     Cut a video between start_time and end_time and save it at output_path.
@@ -195,65 +675,57 @@ def cut_video(
             transitions (intros/outros) between cuts. The default value is 30 seconds.
         preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]): Encoding preset.
             Default is "slow".
+        frame_accurate (bool): Re-encode the video to cut exactly at start_time. If False,
+            the start is moved back to the previous keyframe and the streams are copied.
     """
 
-    if os.path.exists(output_path):
-        logger.info(f"Video already exists at: {output_path}")
-        return
-
     try:
-        # Create output directory if it doesn't exist
-        create_file_folder(output_path)
-
-        input_duration = int(get_audio_duration(input_path))
-
         if not start_time or not end_time:
-            # Define valid range while avoiding the first and last 30 seconds
-            min_start = (
-                transition_duration
-                if transition_duration > 0
-                and input_duration > (transition_duration * 2)
-                else 0
-            )
-            max_end = (
-                input_duration - transition_duration
-                if transition_duration > 0
-                and input_duration > (transition_duration * 2)
-                else input_duration
+            # Choose a random range avoiding the transitions when possible
+            start_time, end_time = get_random_time_range(
+                get_video_duration(input_path),
+                duration,
+                margin=transition_duration,
             )
 
-            if max_end - min_start < duration:
-                # If avoiding transitions makes the video too short, use the full range
-                start_time = min_start
-                end_time = max_end
-                logger.info(
-                    f"""Video too short to avoid transitions. Using full range:
-                        - {start_time}s to {end_time}s.
-                    """,
-                )
-            else:
-                # Choose a random interval within the valid range
-                start_time = random.randint(min_start, int(max_end - duration))
-                end_time = start_time + int(duration)
-
         # Define output settings
-        output_args = {
-            "vcodec": "h264_videotoolbox" if settings.USE_GPU else "libx264",
-            "acodec": "aac",
-            "pix_fmt": "yuv420p",
-            "t": end_time - start_time,
-            "preset": preset,
-            "crf": 18,
-            "b:v": "5000k" if settings.USE_GPU else "3000k",
-            "b:a": "256k",
-        }
-
-        (
-            ffmpeg.input(input_path, ss=start_time)
-            .output(output_path, **output_args)
-            .overwrite_output()
-            .run()
-        )
+        input_args = {}
+        if frame_accurate:
+            output_args = {
+                **get_video_output_args(preset),
+                "acodec": "aac",
+                "t": end_time - start_time,
+                "b:a": "256k",
+            }
+
+            # Without filters, the frames decoded on the GPU go straight to the hardware
+            # encoder. Converting the pixel format would need them back on the CPU
+            input_args = get_hwaccel_input_args(keep_on_gpu=True)
+            if input_args:
+                output_args.pop("pix_fmt")
+        else:
+            # Stream copy can only start at a keyframe, so seek to the previous one
+            keyframe_time = get_keyframe_before(input_path, start_time)
+            end_time -= start_time - keyframe_time
+            start_time = keyframe_time
+            output_args = {
+                "c": "copy",
+                "t": end_time - start_time,
+                "avoid_negative_ts": "make_zero",
+                "movflags": "+faststart",
+            }
+
+        if settings.USE_PYAV and not frame_accurate:
+            # Imported here, so PyAV is only required when it is enabled
+            from src.utils.media import video_av
+
+            video_av.cut_video(input_path, output_path, start_time, end_time)
+        else:
+            run_ffmpeg(
+                ffmpeg.input(input_path, ss=start_time, **input_args)
+                .output(output_path, **output_args)
+                .overwrite_output(),
+            )
 
         logger.info(
             f"Video cut between {start_time}s and {end_time}s at: {output_path}",
@@ -264,12 +736,15 @@ def cut_video(
         raise e
 
 
+@skip_if_exists()
+@ffmpeg_job
 def resize_video(
     input_path: str,
     output_path: str,
     width: int,
     height: int,
     zoom_crop: bool = False,
+    preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
 ) -> None:
     """
     Resize a video to a specific width and height, optionally cropping to fill the frame.
@@ -281,54 +756,64 @@ def resize_video(
         the output video.
         height (int): Height of the output video.
         zoom_crop (bool): Whether to crop the video to fill the entire screen (default: False).
+        preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]): Encoding preset.
+            Default is "slow".
     """
 
-    if os.path.exists(output_path):
-        logger.info(f"Video already exists at: {output_path}")
-        return
-
     try:
-        # Create output directory if it doesn't exist
-        create_file_folder(output_path)
+        # Scale up to cover the target resolution when cropping, or down to fit it when padding.
+        # The size is computed here, so the filters are initialized with constant dimensions
+        input_width, input_height = get_video_resolution(input_path)
+        ratio = (max if zoom_crop else min)(width / input_width, height / input_height)
+        scale_args = (
+            # Even dimensions, as required by the 4:2:0 pixel formats
+            max(2, round(input_width * ratio / 2) * 2),
+            max(2, round(input_height * ratio / 2) * 2),
+        )
 
-        if zoom_crop:
-            # Scale up to cover the entire target resolution, then crop to the exact size
+        if can_scale_on_gpu(input_path):
+            # Decode and scale on the GPU, crop and pad only have software implementations
+            hwaccel = get_hwaccel()
+            stream = ffmpeg.input(
+                input_path,
+                **get_hwaccel_input_args(keep_on_gpu=True),
+            )
             filter_chain = (
-                ffmpeg.input(input_path)
-                .filter(
-                    "scale",
-                    f"iw*max({width}/iw,{height}/ih)",
-                    f"ih*max({width}/iw,{height}/ih)",
-                )
-                .filter(
-                    "crop",
-                    width,
-                    height,
-                    "(iw - ow) / 2",
-                    "(ih - oh) / 2",
-                )  # Center crop
+                stream.video.filter(hwaccel["scale_filter"], *scale_args)
+                .filter("hwdownload")
+                .filter("format", "nv12")
             )
         else:
-            # Scale while maintaining aspect ratio, then pad to enforce exact resolution
-            filter_chain = (
-                ffmpeg.input(input_path)
-                .filter(
-                    "scale",
-                    f"iw*min({width}/iw,{height}/ih)",
-                    f"ih*min({width}/iw,{height}/ih)",
-                )
-                .filter("pad", width, height, "(ow-iw)/2", "(oh-ih)/2")
+            stream = ffmpeg.input(input_path)
+            filter_chain = stream.video.filter("scale", *scale_args)
+
+        if zoom_crop:
+            # Center crop to the exact size
+            filter_chain = filter_chain.filter(
+                "crop",
+                width,
+                height,
+                "(iw - ow) / 2",
+                "(ih - oh) / 2",
+            )
+        else:
+            # Pad to enforce exact resolution
+            filter_chain = filter_chain.filter(
+                "pad",
+                width,
+                height,
+                "(ow-iw)/2",
+                "(oh-ih)/2",
             )
 
-        (
+        run_ffmpeg(
             filter_chain.output(
                 output_path,
-                vcodec="h264_videotoolbox" if settings.USE_GPU else "libx264",
                 acodec="aac",
-                pix_fmt="yuv420p",
+                **get_video_output_args(preset),
             )
-            .overwrite_output()
-            .run()
+            .global_args(*get_filter_thread_args())
+            .overwrite_output(),
         )
 
         resize_info = "with cropping" if zoom_crop else "with padding"
@@ -341,6 +826,8 @@ def resize_video(
         raise e
 
 
+@skip_if_exists()
+@ffmpeg_job
 def combine_video_with_audio(
     video_path: str,
     audio_path: str,
@@ -357,38 +844,24 @@ def combine_video_with_audio(
         volume (float): Volume level for the audio (default is 1.0).
     """
 
-    # check if video exist
-    if os.path.exists(output_path):
-        logger.info(f"Video already exists: {output_path}")
-        return
-
     try:
-        # Create the output directory if it doesn't exist
-        create_file_folder(output_path)
-
-        video_duration = get_video_duration(video_path)
-        audio_duration = get_audio_duration(audio_path)
+        # Adjust volume. A longer audio is cut by "shortest", so the durations are not probed
+        audio_input = ffmpeg.input(audio_path).filter("volume", volume)
 
-        # Trim audio if it's longer than the video
-        audio_input = ffmpeg.input(audio_path)
-        if audio_duration > video_duration:
-            audio_input = audio_input.filter("atrim", duration=video_duration)
-
-        # Adjust volume
-        audio_input = audio_input.filter("volume", volume)
-
-        (
-            ffmpeg.input(video_path)  # Input video
-            .output(
+        # Only the audio is replaced, so the video stream is copied without re-encoding
+        run_ffmpeg(
+            ffmpeg.output(
+                ffmpeg.input(video_path).video,
                 audio_input,
                 output_path,
-                vcodec="libx264",
-                acodec="aac",
-                pix_fmt="yuv420p",
-                shortest=None,
-            )
-            .overwrite_output()
-            .run()
+                **{
+                    "c:v": "copy",
+                    "c:a": "aac",
+                    "b:a": "256k",
+                    "shortest": None,
+                    "movflags": "+faststart",
+                },
+            ).overwrite_output(),
         )
 
         logger.info(f"Video and audio combined successfully: {output_path}")
@@ -398,6 +871,214 @@ def combine_video_with_audio(
         raise e
 
 
+def _open_random_range(
+    file_path: str,
+    input_duration: float,
+    duration: float,
+    margin: int = 0,
+) -> Tuple[ffmpeg.Stream, Tuple[float, float]]:
+    """
+    Open a random range of the given duration of a media file as an ffmpeg input. If the
+    media is shorter than the duration, it is looped from the start instead.
+
+    Args:
+        file_path (str): Path to the media file.
+        input_duration (float): Duration of the media file in seconds.
+        duration (float): Duration of the range in seconds.
+        margin (int): Seconds to avoid at the start and end of the media, if long enough.
+
+    Returns the ffmpeg input and the (start, end) range.
+    """
+    start_time, end_time = get_random_time_range(
+        input_duration,
+        duration,
+        margin=margin,
+    )
+    if end_time - start_time < duration:
+        logger.info(f"{file_path} is shorter than {duration}s. Looping it.")
+        return ffmpeg.input(file_path, stream_loop=-1, t=duration), (0, duration)
+
+    input_stream = ffmpeg.input(file_path, ss=start_time, t=end_time - start_time)
+    return input_stream, (start_time, end_time)
+
+
+def _build_background_graph(
+    video_path: str,
+    audio_path: str,
+    width: int,
+    height: int,
+    duration: float,
+    volume: float = 1.0,
+    fade_duration: int = 0,
+    transition_duration: int = 30,
+) -> Tuple[ffmpeg.Stream, ffmpeg.Stream]:
+    """
+    Build the ffmpeg filter graph that cuts a random range of the background video and audio,
+    scales and crops the video to the target resolution and fades and adjusts the audio.
+    See `build_background_video` for the arguments.
+
+    Returns the background video and audio streams.
+    """
+
+    video_input, (video_start, video_end) = _open_random_range(
+        video_path,
+        get_video_duration(video_path),
+        duration,
+        margin=transition_duration,
+    )
+    audio_input, (audio_start, audio_end) = _open_random_range(
+        audio_path,
+        get_audio_duration(audio_path),
+        duration,
+    )
+    audio_duration = audio_end - audio_start
+
+    # Video: scale up to cover the target resolution and center crop
+    video_stream = video_input.video.filter(
+        "scale",
+        f"iw*max({width}/iw,{height}/ih)",
+        f"ih*max({width}/iw,{height}/ih)",
+    ).filter("crop", width, height, "(iw - ow) / 2", "(ih - oh) / 2")
+
+    # Audio: fade in/out and adjust volume
+    audio_stream = audio_input.audio
+    if fade_duration > 0:
+        # Fade-in/out is at most fade_duration sec or 20% of duration
+        fade = min(fade_duration, audio_duration / 5)
+        audio_stream = audio_stream.filter(
+            "afade",
+            type="in",
+            start_time=0,
+            duration=fade,
+        ).filter(
+            "afade",
+            type="out",
+            start_time=audio_duration - fade,
+            duration=fade,
+        )
+    audio_stream = audio_stream.filter("volume", volume)
+
+    logger.info(f"Background video range selected from {video_start}s to {video_end}s")
+    return video_stream, audio_stream
+
+
+@skip_if_exists()
+@ffmpeg_job
+def build_background_video(
+    video_path: str,
+    audio_path: str,
+    output_path: str,
+    width: int,
+    height: int,
+    duration: float = settings.MIN_VIDEO_DURATION,
+    volume: float = 1.0,
+    fade_duration: int = 0,
+    transition_duration: int = 30,
+    preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
+) -> None:
+    """
+    Cut, resize and mix a background video with a background audio in a single ffmpeg call.
+    It is equivalent to running `cut_video`, `cut_audio`, `resize_video` (with zoom crop) and
+    `combine_video_with_audio`, without writing and decoding the intermediate files.
+
+    Args:
+        video_path (str): Path to the input background video file.
+        audio_path (str): Path to the input background audio file.
+        output_path (str): Path to the output video file.
+        width (int): Width of the output video.
+        height (int): Height of the output video.
+        duration (float): Duration of the output video in seconds. Default is MIN_VIDEO_DURATION.
+        volume (float): Volume level for the audio (default is 1.0).
+        fade_duration (int): Duration of audio fade-in and fade-out effects in seconds.
+            Put 0 to disable.
+        transition_duration (int): Remove seconds from the start and end of the video to avoid
+            transitions (intros/outros) between cuts. The default value is 30 seconds.
+        preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]): Encoding preset.
+            Default is "slow".
+    """
+
+    try:
+        video_stream, audio_stream = _build_background_graph(
+            video_path=video_path,
+            audio_path=audio_path,
+            width=width,
+            height=height,
+            duration=duration,
+            volume=volume,
+            fade_duration=fade_duration,
+            transition_duration=transition_duration,
+        )
+
+        output_args = {
+            **get_video_output_args(preset),
+            "acodec": "aac",
+            "b:a": "256k",
+        }
+
+        run_ffmpeg(
+            ffmpeg.output(video_stream, audio_stream, output_path, **output_args)
+            .global_args(*get_filter_thread_args())
+            .overwrite_output(),
+        )
+
+        logger.info(f"Background video built at: {output_path}")
+
+    except ffmpeg.Error as e:
+        logger.error(f"ffmpeg error: {e.stderr.decode('utf8')}")
+        raise e
+
+
+# Map the accepted positions to a standardized alignment value
+_POSITION_ALIASES = {
+    "up": "top",
+    "down": "bottom",
+    "top": "top",
+    "bottom": "bottom",
+    "center": "center",
+    "left": "left",
+    "right": "right",
+}
+
+# Offset of each alignment within the available area, in halves of the free space
+_ALIGNMENT_FACTORS = {
+    "center": (1, 1),
+    "left": (0, 1),
+    "right": (2, 1),
+    "top": (1, 0),
+    "bottom": (1, 2),
+}
+
+
+def _compute_overlay_position(
+    position: str,
+    width: int,
+    height: int,
+    bg_width: int,
+    bg_height: int,
+    margin: int,
+) -> Tuple[int, int]:
+    """
+    Compute the (x, y) position of an overlay within the background area minus the margins.
+
+    Args:
+        position (str): Desired alignment ("center", "left", "right", "top" or "bottom").
+        width (int): Width of the overlay.
+        height (int): Height of the overlay.
+        bg_width (int): Width of the background.
+        bg_height (int): Height of the background.
+        margin (int): Margin in pixels between the overlay and the background edges.
+    """
+    alignment = _POSITION_ALIASES.get(position.lower(), "center")
+    x_factor, y_factor = _ALIGNMENT_FACTORS[alignment]
+
+    # The factors are in halves of the free space, so the division stays exact
+    x = margin + (bg_width - 2 * margin - width) * x_factor // 2
+    y = margin + (bg_height - 2 * margin - height) * y_factor // 2
+    return (x, y)
+
+
+@skip_if_exists()
+@ffmpeg_job
 def overlay_videos(
     background_video: str,
     overlay_videos: List[str],
@@ -433,209 +1114,381 @@ def overlay_videos(
         normalize_audio (bool, optional): Whether to normalize the audio of overlay videos.
     """
 
-    # Check if the video already exists
-    if os.path.exists(output_path):
-        logger.info(f"Video already exists at: {output_path}")
-        return
+    try:
+        # Decode, scale and composite everything in a single ffmpeg filter graph
+        video_stream, audio_stream, total_duration = _build_overlay_graph(
+            background_video=background_video,
+            overlay_videos=overlay_videos,
+            position=position,
+            zoom=zoom,
+            margin=margin,
+            normalize_audio=normalize_audio,
+        )
 
-    # Create the parent folder of the output path if it doesn't exist
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    # First pass: calculate total overlay duration
-    total_overlay_duration = 0
-    overlay_durations = []
-
-    for video_path in overlay_videos:
-        # Check if the video path is a gap (e.g., "GAP:5")
-        if video_path.startswith("GAP:"):
-            try:
-                gap_duration = float(video_path.split(":")[1])
-                overlay_durations.append(gap_duration)
-                total_overlay_duration += gap_duration
-                continue
-            except Exception as e:
-                logger.error(f"Invalid gap format: {video_path} ({e})")
-                continue
-
-        # Check if is an audio file
-        if video_path.endswith(".mp3") or video_path.endswith(".wav"):
-            gap_duration = get_audio_duration(video_path)
-            overlay_durations.append(gap_duration)
-            total_overlay_duration += gap_duration
-            continue
+        output_args = {
+            **get_video_output_args(preset),
+            "acodec": "aac",
+            "b:a": "256k",
+            "t": total_duration,
+        }
+        run_ffmpeg(
+            ffmpeg.output(video_stream, audio_stream, output_path, **output_args)
+            .global_args(*get_filter_thread_args())
+            .overwrite_output(),
+        )
 
-        try:
-            clip = VideoFileClip(video_path)
-            overlay_durations.append(clip.duration)
-            total_overlay_duration += clip.duration
-            clip.close()
-        except Exception as e:
-            logger.error(f"Error calculating duration for {video_path}: {e}")
-            overlay_durations.append(0)
-
-    if total_overlay_duration <= 0:
-        raise ValueError("No valid overlay videos provided or total duration is zero.")
+        logger.info(f"Video with overlays created successfully: {output_path}")
+
+    except ffmpeg.Error as e:
+        logger.error(f"ffmpeg error: {e.stderr.decode('utf8') if e.stderr else e}")
+        raise e
 
-    # Load background video and ensure it's long enough
-    bg_clip = VideoFileClip(background_video)
-    bg_duration = bg_clip.duration
-
-    if bg_duration < total_overlay_duration:
-        logger.warning(
-            f"""
-            Background video ({bg_duration}s) is shorter than total overlay
-            duration ({total_overlay_duration}s). Looping background.
-            """,
-        )
-
-        # Calculate how many loops we need
-        loops_needed = int(total_overlay_duration // bg_duration) + 1
-        bg_clips = [bg_clip] * loops_needed
-        bg_clip = concatenate_videoclips(bg_clips)
-
-        # Trim to exact needed duration
-        bg_clip = bg_clip.subclip(0, total_overlay_duration)
-
-    bg_fps = bg_clip.fps if bg_clip.fps else 30
-    bg_width, bg_height = bg_clip.size
-
-    # Define the available area (background minus margins)
-    available_width = bg_width - 2 * margin
-    available_height = bg_height - 2 * margin
-
-    # Map the provided position to a standardized alignment value
-    pos_map = {
-        "up": "top",
-        "down": "bottom",
-        "center": "center",
-        "left": "left",
-        "right": "right",
-    }
-    mapped_position = pos_map.get(position.lower(), "center")
-
-    # Helper function to compute the (x, y) position within the available area
-    def _compute_position(
-        alignment: str,
-        new_width: int,
-        new_height: int,
-    ) -> tuple[int, int]:
-        if alignment == "center":
-            x = margin + (available_width - new_width) // 2
-            y = margin + (available_height - new_height) // 2
-        elif alignment == "left":
-            x = margin
-            y = margin + (available_height - new_height) // 2
-        elif alignment == "right":
-            x = bg_width - margin - new_width
-            y = margin + (available_height - new_height) // 2
-        elif alignment == "top":
-            x = margin + (available_width - new_width) // 2
-            y = margin
-        elif alignment == "bottom":
-            x = margin + (available_width - new_width) // 2
-            y = bg_height - margin - new_height
-        else:
-            x = margin + (available_width - new_width) // 2
-            y = margin + (available_height - new_height) // 2
-        return (x, y)
 
-    # Process each overlay video
-    overlay_clips = []
-    current_time = 0  # Start time offset for sequential playback
+# Extensions of the overlay items that only add audio
+_AUDIO_EXTENSIONS = (".mp3", ".wav")
 
-    for i, video_path in enumerate(overlay_videos):
 
-        # Skip if the video path is a placeholder for a gap
-        if video_path.startswith("GAP:"):
-            current_time += overlay_durations[i]
+def _get_overlay_kind(video_path: str) -> Literal["gap", "audio", "video"]:
+    """
+    Classify an overlay item: a 'GAP:<duration>' placeholder, an audio file or a video.
+
+    Args:
+        video_path (str): The overlay item.
+    """
+
+    if video_path.startswith("GAP:"):
+        return "gap"
+    elif video_path.endswith(_AUDIO_EXTENSIONS):
+        return "audio"
+    else:
+        return "video"
+
+
+def _get_overlay_duration(
+    video_path: str,
+    kind: Literal["gap", "audio", "video"],
+) -> float:
+    """
+    Get the duration of an overlay item.
+
+    Args:
+        video_path (str): The overlay item.
+        kind (literal["gap", "audio", "video"]): The kind of the item.
+    """
+
+    if kind == "gap":
+        return float(video_path.split(":")[1])
+    elif kind == "audio":
+        return get_audio_duration(video_path)
+    else:
+        return get_video_duration(video_path)
+
+
+def _build_overlay_graph(
+    background_video: str,
+    overlay_videos: List[str],
+    position: Literal["center", "left", "right", "top", "bottom"] = "center",
+    zoom: float = 1.0,
+    margin: int = 50,
+    normalize_audio: bool = True,
+    background_audio: Optional[str] = None,
+    background_audio_volume: float = 1.0,
+    background_fade_duration: int = 0,
+) -> Tuple[ffmpeg.Stream, ffmpeg.Stream, float]:
+    """
+    Build the ffmpeg filter graph that places the overlay videos sequentially on top of the
+    background video. It accepts the same overlay items as `overlay_videos` (videos, audio files
+    and 'GAP:<duration>' placeholders).
+
+    If a background audio is given, the background video is taken as raw media: a random range
+    of both is cut, the video is resized to the screen and the audio is mixed in the same graph,
+    as `build_background_video` does. Otherwise the background video is used as it is.
+
+    Returns the composed video stream, the mixed audio stream and the total duration.
+    """
+
+    # Schedule every overlay item sequentially in time. The files not probed yet are probed
+    # in parallel, since each probe waits on an ffprobe process
+    overlay_kinds = [_get_overlay_kind(video_path) for video_path in overlay_videos]
+    with ThreadPoolExecutor() as executor:
+        overlay_durations = list(
+            executor.map(_get_overlay_duration, overlay_videos, overlay_kinds),
+        )
+
+    total_duration = sum(overlay_durations)
+    if total_duration <= 0:
+        raise ValueError("No valid overlay videos provided or total duration is zero.")
+
+    if background_audio:
+        bg_width, bg_height = settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT
+        video_stream, bg_audio_stream = _build_background_graph(
+            video_path=background_video,
+            audio_path=background_audio,
+            width=bg_width,
+            height=bg_height,
+            duration=total_duration,
+            volume=background_audio_volume,
+            fade_duration=background_fade_duration,
+        )
+        audio_streams = [bg_audio_stream]
+    else:
+        # Loop the background if it is shorter than the overlays and trim it to the duration
+        loop = -1 if get_video_duration(background_video) < total_duration else 0
+        background = ffmpeg.input(background_video, stream_loop=loop, t=total_duration)
+        bg_width, bg_height = get_video_resolution(background_video)
+        video_stream = background.video
+        audio_streams = [
+            (
+                background.audio
+                if has_audio_stream(background_video)
+                else ffmpeg.input(
+                    "anullsrc=r=44100:cl=stereo",
+                    f="lavfi",
+                    t=total_duration,
+                ).audio
+            ),
+        ]
+
+    current_time = 0
+    for video_path, kind, duration in zip(
+        overlay_videos,
+        overlay_kinds,
+        overlay_durations,
+    ):
+        start_time = current_time
+        current_time += duration
+
+        # Gaps only move the time offset
+        if kind == "gap":
             continue
 
-        # Add a transparent placeholder video if is an audio file
-        # Check if is an audio file
-        if video_path.endswith(".mp3") or video_path.endswith(".wav"):
-            audio_clip = AudioFileClip(video_path)
-            duration = audio_clip.duration
-            placeholder_clip = (
-                ColorClip(size=(10, 10), color=(0, 0, 0), duration=duration)
-                .set_opacity(0)
-                .set_audio(audio_clip)
-                .set_start(current_time)
+        overlay_input = ffmpeg.input(video_path)
+        delay_ms = int(start_time * 1000)
+
+        # Audio files are only added to the audio mix
+        if kind == "audio":
+            audio_streams.append(
+                overlay_input.audio.filter("adelay", delays=delay_ms, all=1),
             )
-            overlay_clips.append(placeholder_clip)
-            current_time += duration
             continue
 
-        try:
-            clip = VideoFileClip(video_path)
-            clip_fps = clip.fps if clip.fps else bg_fps
-            clip_width, clip_height = clip.size
+        # Scale the clip to fit the available area (then apply zoom) and position it
+        clip_width, clip_height = get_video_resolution(video_path)
+        scale_factor = (
+            min(
+                (bg_width - 2 * margin) / clip_width,
+                (bg_height - 2 * margin) / clip_height,
+            )
+            * zoom
+        )
+        new_width = int(clip_width * scale_factor)
+        new_height = int(clip_height * scale_factor)
+        x, y = _compute_overlay_position(
+            position,
+            new_width,
+            new_height,
+            bg_width,
+            bg_height,
+            margin,
+        )
+
+        clip = overlay_input.video.filter("scale", new_width, new_height).filter(
+            "setpts",
+            f"PTS-STARTPTS+{start_time}/TB",
+        )
+        video_stream = ffmpeg.overlay(
+            video_stream,
+            clip,
+            x=x,
+            y=y,
+            eof_action="pass",
+            enable=f"between(t,{start_time},{current_time})",
+        )
+
+        if has_audio_stream(video_path):
+            clip_audio = overlay_input.audio
+            if normalize_audio:
+                clip_audio = clip_audio.filter("volume", 1.2)
+            audio_streams.append(clip_audio.filter("adelay", delays=delay_ms, all=1))
+
+    # Mix the background audio with the overlay audios without lowering their volume. The
+    # background audio is first: it lasts the total duration, looping if needed
+    audio_stream = (
+        ffmpeg.filter(
+            audio_streams,
+            "amix",
+            inputs=len(audio_streams),
+            duration="first",
+            normalize=0,
+        )
+        if len(audio_streams) > 1
+        else audio_streams[0]
+    )
+
+    return video_stream, audio_stream, total_duration
+
+
+@skip_if_exists()
+@ffmpeg_job
+def _render_final_reel(
+    background_video: str,
+    overlay_videos: List[str],
+    output_path: str,
+    thumbnail_path: str = None,
+    caption_path: str = None,
+    font_path: str = "assets/fonts",
+    fade_out_duration: float = 0,
+    thumbnail_time: float = 1,
+    position: Literal["center", "left", "right", "top", "bottom"] = "center",
+    zoom: float = 1.0,
+    margin: int = 50,
+    normalize_audio: bool = True,
+    background_audio: Optional[str] = None,
+    background_audio_volume: float = 1.0,
+    background_fade_duration: int = 0,
+    preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
+) -> None:
+    """
+    Render the final reel and its thumbnail in a single ffmpeg call.
+    See `render_final_reel` for the arguments.
+    """
+
+    try:
+        video_stream, audio_stream, total_duration = _build_overlay_graph(
+            background_video=background_video,
+            overlay_videos=overlay_videos,
+            position=position,
+            zoom=zoom,
+            margin=margin,
+            normalize_audio=normalize_audio,
+            background_audio=background_audio,
+            background_audio_volume=background_audio_volume,
+            background_fade_duration=background_fade_duration,
+        )
 
-            # Compute scale factor so the clip fits within the available area (then apply zoom)
-            scale_factor = (
-                min(available_width / clip_width, available_height / clip_height) * zoom
+        if caption_path:
+            video_stream = video_stream.filter(
+                "subtitles",
+                caption_path,
+                fontsdir=(
+                    Path(font_path).parent if font_path.endswith(".ttf") else font_path
+                ),
             )
-            new_width = int(clip_width * scale_factor)
-            new_height = int(clip_height * scale_factor)
 
-            # Compute the (x, y) position within the available area
-            pos = _compute_position(mapped_position, new_width, new_height)
+        if fade_out_duration > 0:
+            video_stream = video_stream.filter(
+                "fade",
+                type="out",
+                start_time=max(total_duration - fade_out_duration, 0),
+                duration=fade_out_duration,
+            )
 
-            # Resize video
-            resized_clip = clip.resize((new_width, new_height)).set_fps(clip_fps)
+        output_args = {
+            **get_video_output_args(preset),
+            "acodec": "aac",
+            "b:a": "256k",
+            "t": total_duration,
+        }
 
-            # Normalize audio volume (optional)
-            if normalize_audio and resized_clip.audio:
-                resized_clip = resized_clip.volumex(
-                    1.2,
-                )  # Adjust to balance audio levels
+        if thumbnail_path and not os.path.exists(thumbnail_path):
+            # Split the decoded frames to feed the reel and the thumbnail outputs
+            create_file_folder(thumbnail_path)
+            split = video_stream.split()
+            thumbnail = (
+                split[1]
+                .filter("trim", start=thumbnail_time)
+                .filter("setpts", "PTS-STARTPTS")
+            )
+            outputs = ffmpeg.merge_outputs(
+                ffmpeg.output(split[0], audio_stream, output_path, **output_args),
+                ffmpeg.output(thumbnail, thumbnail_path, vframes=1),
+            )
+        else:
+            outputs = ffmpeg.output(
+                video_stream,
+                audio_stream,
+                output_path,
+                **output_args,
+            )
 
-            # Set the start time for sequential playback
-            resized_clip = resized_clip.set_start(current_time).set_position(pos)
-            current_time += overlay_durations[i]  # Use pre-calculated duration
+        run_ffmpeg(outputs.global_args(*get_filter_thread_args()).overwrite_output())
 
-            overlay_clips.append(resized_clip)
+        logger.info(f"Final reel rendered successfully: {output_path}")
 
-        except Exception as e:
-            logger.error(f"Error processing {video_path}: {e}")
-            continue
+    except ffmpeg.Error as e:
+        logger.error(f"ffmpeg error: {e.stderr.decode('utf8') if e.stderr else e}")
+        raise e
 
-    if not overlay_clips:
-        raise ValueError("No valid overlay videos could be processed.")
 
-    # Trim the background video to exactly match the total overlay duration
-    bg_clip = bg_clip.subclip(0, total_overlay_duration)
+def render_final_reel(
+    background_video: str,
+    overlay_videos: List[str],
+    output_path: str,
+    thumbnail_path: str = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Render the final reel in a single ffmpeg call: overlay the videos on the background, burn the
+    captions, apply the fade out and extract the thumbnail from the same decoding pass. It is
+    equivalent to running `overlay_videos`, `add_captions`, `add_fade_out` and
+    `extract_video_thumbnail` without the intermediate files. If a background audio is given,
+    the background is also cut, resized and mixed in the same call (see `build_background_video`).
 
-    # Composite the background with the overlay clips
-    composite = CompositeVideoClip([bg_clip] + overlay_clips, size=bg_clip.size)
-    composite.duration = total_overlay_duration  # Ensure correct duration
+    Args:
+        background_video (str): Path to the background video file. If background_audio is given,
+            the raw background video file.
+        overlay_videos (List[str]): List of overlay items. See `overlay_videos`.
+        output_path (str): Path to save the output video file.
+        thumbnail_path (str, optional): Path to save the PNG thumbnail. If None, no thumbnail is
+            extracted. If the reel already exists, the thumbnail is extracted from it.
+        caption_path (str, optional): Path to the ASS/SRT subtitle file. If None, no captions are
+            added.
+        font_path (str, optional): The path of the font file. Defaults to assets/fonts.
+        fade_out_duration (float, optional): Duration of the fade-to-black effect at the end of
+            the video. Put 0 to disable.
+        thumbnail_time (float, optional): Time (in seconds) to extract the thumbnail frame.
+        position (str, optional): Alignment of the overlay videos. See `overlay_videos`.
+        zoom (float, optional): Zoom factor for resizing the overlay videos.
+        margin (int, optional): Margin in pixels between the overlays and the background edges.
+        normalize_audio (bool, optional): Whether to normalize the audio of overlay videos.
+        background_audio (str, optional): Path to the raw background audio file. If None, the
+            background video is used as it is.
+        background_audio_volume (float, optional): Volume level for the background audio.
+        background_fade_duration (int, optional): Duration of the background audio fade-in and
+            fade-out effects in seconds. Put 0 to disable.
+        preset (str, optional): The encoding preset for the output video.
+            Default is taken from settings.PRESET.
+    """
 
-    # Write the final video
-    composite.write_videofile(
+    _render_final_reel(
+        background_video,
+        overlay_videos,
         output_path,
-        fps=bg_fps,
-        codec="h264_videotoolbox" if settings.USE_GPU else "libx264",
-        audio_codec="aac",
-        preset=preset,
-        threads=4,  # Add threads parameter for better performance
-        ffmpeg_params=["-movflags", "+faststart"],  # For better streaming
+        thumbnail_path,
+        **kwargs,
     )
 
-    # Cleanup resources
-    bg_clip.close()
-    for clip in overlay_clips:
-        clip.close()
-
-    logger.info(f"Video with overlays created successfully: {output_path}")
+    # The reel is skipped if it already exists, without the thumbnail it extracts
+    if thumbnail_path and not os.path.exists(thumbnail_path):
+        extract_video_thumbnail(
+            output_path,
+            thumbnail_path,
+            time=kwargs.get("thumbnail_time", 1),
+        )
 
 
+@skip_if_exists("output_file")
+@ffmpeg_job
 def add_captions(
     input_file: str,
     output_file: str,
     caption_path: str,
     font_path: str = "assets/fonts",
+    preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
 ) -> None:
     """
-    Incorporate a ASS/SRT subtitle file into the input video.
+    Incorporate a ASS/SRT subtitle file into the input video. Only the video is re-encoded,
+    the audio is copied.
 
     Args:
         input_file (str): The path of the input video.
@@ -643,32 +1496,30 @@ def add_captions(
         caption_path (str): The path of the subtitle file.
         font_path (str, optional): The path of the font file. Defaults to assets/fonts.
             This path file must be defined correctly inif the subtitle file uses a custom font.
+        preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]): Encoding preset.
+            Default is "slow".
     """
 
-    # check if output_path exists
-    if os.path.exists(output_file):
-        logger.info(
-            f"Output file {output_file} already exists, skipping video overlay.",
-        )
-        return
-
     try:
-        # Create output directory if it doesn't exist
-        create_file_folder(output_file)
-        video = ffmpeg.input(input_file)
-        audio = video.audio
-
-        video = video.filter(
+        stream = ffmpeg.input(input_file)
+        video = stream.video.filter(
             "subtitles",
             caption_path,
             fontsdir=(
                 Path(font_path).parent if font_path.endswith(".ttf") else font_path
             ),
         )
-        ffmpeg.concat(video, audio, v=1, a=1).output(
-            output_file,
-            loglevel="quiet",
-        ).run()
+        run_ffmpeg(
+            ffmpeg.output(
+                video,
+                stream.audio,
+                output_file,
+                loglevel="quiet",
+                **{**get_video_output_args(preset), "c:a": "copy"},
+            )
+            .global_args(*get_filter_thread_args())
+            .overwrite_output(),
+        )
 
         logger.info(f"Subtitle added successfully to video at {output_file}")
 
@@ -679,6 +1530,8 @@ def add_captions(
         raise e
 
 
+@skip_if_exists()
+@ffmpeg_job
 def extract_video_thumbnail(video_path: str, output_path: str, time: int = 1):
     """
     Extracts a thumbnail from a video at a specified time using ffmpeg-python.
@@ -689,21 +1542,23 @@ def extract_video_thumbnail(video_path: str, output_path: str, time: int = 1):
         time (int, optional): Time (in seconds) to extract the frame. Defaults to 1s.
     """
 
-    # Check if thumbnail exists
-    if os.path.exists(output_path):
-        logger.info(f"Thumbnail already exists at {output_path}. Skipping extraction.")
-        return
+    # Seek to the keyframe before the given second, without decoding up to the exact time
+    input_args = {"ss": time, "noaccurate_seek": None} if time > 0 else {}
 
     try:
-        # Create output directory if it doesn't exist
-        create_file_folder(output_path)
-        (
-            ffmpeg.input(video_path, ss=time)  # Seek to the given second
-            .output(output_path, vframes=1)  # Extract 1 frame
-            .run(
-                overwrite_output=True,
-                capture_stderr=True,
-            )  # Capture errors for debugging
+        run_ffmpeg(
+            ffmpeg.input(video_path, **input_args)
+            .output(
+                output_path,
+                vframes=1,  # Extract 1 frame
+                vcodec="png",
+                format="image2",
+                update=1,
+                an=None,
+                sn=None,
+                dn=None,
+            )
+            .overwrite_output(),
         )
         logger.info(f"Video thumbnail extracted successfully at {output_path}.")
 
@@ -712,25 +1567,34 @@ def extract_video_thumbnail(video_path: str, output_path: str, time: int = 1):
         raise e
 
 
-def add_fade_out(input_path: str, fade_duration: float = 1.5, output_path: str = None):
+@ffmpeg_job
+def add_fade_out(
+    input_path: str,
+    fade_duration: float = 1.5,
+    output_path: str = None,
+    preset: Literal["veryslow", "slow", "medium", "fast", "veryfast"] = settings.PRESET,
+):
     """
-    Adds a fade-to-black effect at the end of a video using moviepy.
+    Adds a fade-to-black effect at the end of a video using the ffmpeg fade filter.
+    The audio is copied.
 
     Args:
         input_path (str): Path to input video.
         fade_duration (float): Duration (in seconds) of the fade effect. Default is 1.5.
         output_path (str): Path to save the output video. Default is None.
             If None, it will overwrite the input video.
+        preset (literal["veryslow", "slow", "medium", "fast", "veryfast"]): Encoding preset.
+            Default is "slow".
     """
-    clip = VideoFileClip(input_path)
-    faded = clip.fx(vfx.fadeout, duration=fade_duration)
 
     # Determine where to write
     if output_path:
         target = output_path
+        create_file_folder(target)
     else:
         # temp file in same directory
         base, ext = os.path.splitext(input_path)
+        os.makedirs(settings.TEMP_PATH, exist_ok=True)
         tmp = tempfile.NamedTemporaryFile(
             dir=settings.TEMP_PATH,
             prefix=os.path.basename(base) + "_fade_",
@@ -740,16 +1604,27 @@ def add_fade_out(input_path: str, fade_duration: float = 1.5, output_path: str =
         tmp.close()
         target = tmp.name
 
-    # Write out
-    faded.write_videofile(target, codec="libx264", audio_codec="aac")
+    # Write out, only the video is re-encoded
+    stream = ffmpeg.input(input_path)
+    video = stream.video.filter(
+        "fade",
+        type="out",
+        start_time=max(get_video_duration(input_path) - fade_duration, 0),
+        duration=fade_duration,
+    )
+    output_streams = [video, stream.audio] if has_audio_stream(input_path) else [video]
+    run_ffmpeg(
+        ffmpeg.output(
+            *output_streams,
+            target,
+            **{**get_video_output_args(preset), "c:a": "copy"},
+        ).overwrite_output(),
+    )
 
     # If no explicit output, replace original
     if output_path is None:
         os.replace(target, input_path)
 
-    clip.close()
-    faded.close()
-
 
 def shift_caption_start(
     input_file: str,
@@ -769,11 +1644,8 @@ def shift_caption_start(
 
     subs = pysubs2.load(input_file)
 
-    # Standarize start dialogue to be at 0.0 ms
-    subs.shift(ms=-subs[0].start)
-
-    # # Shift to start with the new start time
-    subs.shift(ms=start_time * 1000)
+    # Shift the dialogues in a single pass, so the first one starts at the new start time
+    subs.shift(ms=start_time * 1000 - subs[0].start)
 
     # Save
     subs.save(output_file if output_file else input_file)
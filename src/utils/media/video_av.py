@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import av
+
+
+def cut_video(
+    input_path: str,
+    output_path: str,
+    start_time: float,
+    end_time: float,
+) -> None:
+    """
+    Cut a video between start_time and end_time copying the streams in-process with PyAV.
+    For short clips, spawning an ffmpeg process costs more than copying the packets.
+    The packets are not re-encoded, so start_time must be a keyframe.
+
+    Args:
+        input_path (str): Path to the input video file.
+        output_path (str): Path to the output video file.
+        start_time (float): Start time in seconds, at a keyframe.
+        end_time (float): End time in seconds.
+    """
+
+    with (
+        av.open(input_path) as container,
+        av.open(
+            output_path,
+            "w",
+            options={"movflags": "+faststart"},
+        ) as output,
+    ):
+        streams = [
+            stream for stream in container.streams if stream.type in ("video", "audio")
+        ]
+        output_streams = {
+            stream.index: output.add_stream_from_template(stream) for stream in streams
+        }
+
+        container.seek(int(start_time * av.time_base), backward=True)
+
+        finished = set()
+        for packet in container.demux(streams):
+            # Skip the empty packets used to flush the decoders
+            if packet.dts is None or packet.pts is None:
+                continue
+
+            # The decoding timestamps are monotonic, so they tell when a stream is done
+            if packet.dts * packet.time_base >= end_time:
+                finished.add(packet.stream.index)
+                if len(finished) == len(streams):
+                    break
+                continue
+
+            # The audio packets before the video keyframe would play before the first frame
+            if (
+                packet.stream.type == "audio"
+                and packet.pts * packet.time_base < start_time
+            ):
+                continue
+
+            # Make the timestamps start from zero in every stream
+            offset = round(start_time / packet.time_base)
+            packet.pts -= offset
+            packet.dts -= offset
+            packet.stream = output_streams[packet.stream.index]
+            output.mux(packet)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import re
+from functools import lru_cache
 
 import praw
 from loguru import logger
@@ -18,12 +19,27 @@ def parse_comment_permalink(comment: praw.models.Comment, post_id: str) -> str:
         post_id: Reddit post ID
     """
 
-    [post_id] + ["comment"] + [comment.id] + ["/"]
+    # Keep the permalink up to the last 4 parts (post id, title, comment id and the
+    # trailing slash)
+    return comment.permalink.rsplit("/", 4)[0] + f"/{post_id}/comment/{comment.id}/"
 
-    return (
-        "/".join(comment.permalink.split("/")[:-4])
-        + f"/{post_id}/comment/{comment.id}/"
+
+@lru_cache(maxsize=1)
+def get_reddit_client() -> praw.Reddit:
+    """
+    Get the Reddit client. It is created once per process and shared by every request.
+    The threads are only read, so the client is read only and never fetches the user.
+    """
+    reddit = praw.Reddit(
+        client_id=settings.REDDIT_CLIENT_ID,
+        client_secret=settings.REDDIT_CLIENT_SECRET,
+        user_agent="Accessing Reddit threads",
+        username=settings.REDDIT_USER_NAME,
+        passkey=settings.REDDIT_USER_PASSWORD,
+        check_for_async=False,
     )
+    reddit.read_only = True
+    return reddit
 
 
 def get_reddit_object(url: str) -> RedditPost:
@@ -36,28 +52,27 @@ def get_reddit_object(url: str) -> RedditPost:
 
     if re.match(settings.REDDIT_PATTERN, url):
 
-        reddit = praw.Reddit(
-            client_id=settings.REDDIT_CLIENT_ID,
-            client_secret=settings.REDDIT_CLIENT_SECRET,
-            user_agent="Accessing Reddit threads",
-            username=settings.REDDIT_USER_NAME,
-            passkey=settings.REDDIT_USER_PASSWORD,
-            check_for_async=False,
-        )
-        thread = reddit.submission(url=url)
+        thread = get_reddit_client().submission(url=url)
+        post_id = thread.id
+
+        # Drop the "load more comments" stubs without requesting them, only the comments
+        # already loaded with the thread are used
+        thread.comments.replace_more(limit=0)
 
+        # The comments come already typed from praw, so they skip the field validation.
+        # The post is still validated, as its language must be detected and checked
         return RedditPost(
-            post_id=thread.id,
+            post_id=post_id,
             title=thread.title,
             body=thread.selftext,
             comments=[
-                RedditComment(
+                RedditComment.model_construct(
                     comment_id=comment.id,
-                    post_id=thread.id,
+                    post_id=post_id,
                     body=comment.body,
                     author=comment.author.name,
                     score=comment.score,
-                    permalink=parse_comment_permalink(comment, thread.id),
+                    permalink=parse_comment_permalink(comment, post_id),
                 )
                 for comment in thread.comments.list()
                 if isinstance(comment, praw.models.Comment)
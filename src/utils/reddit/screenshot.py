@@ -1,14 +1,66 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import io
 import json
 import os
-from typing import List, Literal, Tuple
+import time
+from typing import Awaitable, Dict, List, Literal, Optional, Tuple, Union
+from urllib.parse import urlparse
 
 from loguru import logger
 from PIL import Image
-from playwright.async_api import Browser, BrowserContext, async_playwright
+from playwright.async_api import (
+    Browser,
+    BrowserContext,
+    ElementHandle,
+    Locator,
+    Page,
+    Route,
+)
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright
 
 from src.config import settings
-from src.schemas import RedditComment
+from src.schemas import RedditComment, RedditPost
+from src.utils.common import create_file_folder
+
+# Requests never shown in the screenshots: videos, ads and analytics. Images, fonts and
+# stylesheets are kept, since the captured elements use them
+BLOCKED_RESOURCE_TYPES = {"media"}
+BLOCKED_HOSTS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "events.reddit.com",
+    "w3-reporting.reddit.com",
+    "error-tracking.reddit.com",
+)
+
+# The screenshot parts are joined in memory and end up in a lossy video, so a high quality
+# JPEG is enough and faster to encode in the browser than PNG
+SCREENSHOT_PART_ARGS = {"type": "jpeg", "quality": 95}
+
+# The logged in session saved at REDDIT_STATE_PATH is reused until it is older than a week
+REDDIT_STATE_MAX_AGE = 7 * 24 * 60 * 60
+# Cookie that Reddit only sets for logged in sessions
+REDDIT_SESSION_COOKIE = "reddit_session"
+
+
+async def block_unused_requests(route: Route) -> None:
+    """
+    Abort the requests that are not needed for the screenshots, so the pages load faster.
+
+    Args:
+        route: Playwright route of the request
+    """
+
+    request = route.request
+    host = urlparse(request.url).hostname or ""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
 
 
 async def login_reddit(context: BrowserContext, timeout: int = 5000) -> BrowserContext:
@@ -33,7 +85,12 @@ async def login_reddit(context: BrowserContext, timeout: int = 5000) -> BrowserC
             settings.REDDIT_USER_PASSWORD,
         )
         await page.get_by_role("button", name="Log In").click()
-        await page.wait_for_timeout(timeout)
+
+        # Reddit leaves the login page once the login succeeds
+        try:
+            await page.wait_for_url(lambda url: "/login" not in url, timeout=timeout)
+        except PlaywrightTimeoutError:
+            logger.warning("The login page is still open, continuing anyway.")
 
         logger.info(
             f"Logged in to Reddit using the username: {settings.REDDIT_USER_NAME}",
@@ -47,20 +104,34 @@ async def login_reddit(context: BrowserContext, timeout: int = 5000) -> BrowserC
     return page
 
 
+async def has_reddit_session(context: BrowserContext) -> bool:
+    """
+    Check if a browser context holds a Reddit session that has not expired.
+
+    Args:
+        context: Playwright context
+    """
+
+    for cookie in await context.cookies("https://www.reddit.com"):
+        if cookie["name"] == REDDIT_SESSION_COOKIE:
+            # Session cookies have an expiry of -1
+            return cookie["expires"] < 0 or cookie["expires"] > time.time()
+
+    return False
+
+
 async def build_browser_context(
     playwright_instance: async_playwright,
-    url: str,
-    theme: Literal["dark", "Light"] = "light",
-    timeout: int = 5000,
+    theme: Literal["dark", "light"] = "light",
 ) -> Tuple[BrowserContext, Browser]:
     """
-    Build a Playwright browser context
+    Build a logged in Playwright browser context. The context can be shared to take several
+    screenshots without launching a new browser and logging in for each one. The session is
+    saved after logging in and reused by the next contexts while it is recent.
 
     Args:
         playwright_instance: Playwright instance
-        url: Reddit URL, can we a post or a comment
         theme: "light" or "dark" mode
-        timeout: Timeout in milliseconds. Default is 5000
     """
 
     browser = await playwright_instance.chromium.launch(headless=True)
@@ -69,21 +140,54 @@ async def build_browser_context(
     cookie_file = open(f"./data/cookies/cookie-{theme}-mode.json", encoding="utf-8")
     dsf = (settings.SCREEN_WIDTH // 600) + 1
 
+    # Reuse the saved session if it is recent enough, to skip the login
+    state_path = settings.REDDIT_STATE_PATH
+    logged_in = (
+        os.path.exists(state_path)
+        and time.time() - os.path.getmtime(state_path) < REDDIT_STATE_MAX_AGE
+    )
+
     context = await browser.new_context(
         locale="en-us",
         color_scheme=theme,
         viewport={"width": settings.SCREEN_WIDTH, "height": settings.SCREEN_HEIGHT},
         device_scale_factor=dsf,
         user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",  # noqa: E501
+        storage_state=state_path if logged_in else None,
     )
 
     cookies = json.load(cookie_file)
     cookie_file.close()
 
     await context.add_cookies(cookies)  # load preference cookies
+    await context.route("**/*", block_unused_requests)
 
-    # Login to Reddit
+    # The saved session may have been logged out (e.g. expired) before it was a week old
+    if logged_in and await has_reddit_session(context):
+        logger.info(f"Reusing the Reddit session saved at: {state_path}")
+        return context, browser
+
+    # Login to Reddit and save the session for the next contexts
     page = await login_reddit(context)
+    if page:
+        if await has_reddit_session(context):
+            create_file_folder(state_path)
+            await context.storage_state(path=state_path)
+        await page.close()
+
+    return context, browser
+
+
+async def open_page(context: BrowserContext, url: str) -> Page:
+    """
+    Open a Reddit url in a new page of the given browser context
+
+    Args:
+        context: Playwright browser context
+        url: Reddit URL, can we a post or a comment
+    """
+
+    page = await context.new_page()
 
     # Open Reddit thread
     await page.goto(url, timeout=0)
@@ -91,40 +195,79 @@ async def build_browser_context(
         {"width": settings.SCREEN_WIDTH, "height": settings.SCREEN_HEIGHT},
     )
     await page.wait_for_load_state()
-    await page.wait_for_timeout(timeout)
 
-    # Scroll to the bottom of the page
+    # Scroll to the bottom of the page. The callers wait for the elements they need instead
+    # of sleeping a fixed time
     await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-    await page.wait_for_timeout(timeout)
 
     logger.info(f"Opened Reddit url: {url}")
 
-    return page, browser
+    return page
 
 
-def join_images_vertically(image_paths: list, output_path: str) -> None:
+def join_images_vertically(images: List[Union[str, bytes]], output_path: str) -> None:
     """
     Combine multiple images vertically into a single image.
 
     Args:
-        image_paths (list): List of image file paths to combine.
+        images (List[Union[str, bytes]]): List of image file paths or encoded images
+            (e.g. PNG screenshots) to combine.
         output_path (str): Path to save the combined image.
     """
-    images = [Image.open(path) for path in image_paths]
+    images = [
+        Image.open(io.BytesIO(image) if isinstance(image, bytes) else image)
+        for image in images
+    ]
     total_height = sum(img.height for img in images)
     min_width = min(img.width for img in images)
 
     combined_image = Image.new("RGB", (min_width, total_height))
 
+    # Opening only reads the image headers, so each part is decoded on paste and freed
+    # right after, instead of keeping all of them in memory until the end
     y_offset = 0
     for img in images:
         combined_image.paste(img, (0, y_offset))
         y_offset += img.height
+        img.close()
 
-    combined_image.save(output_path)
+    # The image is only read back by ffmpeg, so favour a fast PNG compression
+    create_file_folder(output_path)
+    combined_image.save(output_path, compress_level=1)
     logger.info(f"Combined image saved to: {output_path}")
 
 
+async def screenshot_elements(
+    locators: Dict[str, Union[Locator, ElementHandle, None]],
+    timeout: Optional[float] = None,
+) -> List[bytes]:
+    """
+    Take the screenshots of several elements of a page concurrently, in memory. The elements
+    that are missing or fail to be captured are skipped.
+
+    Args:
+        locators: Elements to capture, by name, in the order they are joined
+        timeout: Timeout in milliseconds. If None, the Playwright default is used.
+    """
+    located = [(name, locator) for name, locator in locators.items() if locator]
+    results = await asyncio.gather(
+        *(
+            locator.screenshot(timeout=timeout, **SCREENSHOT_PART_ARGS)
+            for _, locator in located
+        ),
+        return_exceptions=True,
+    )
+
+    screenshots = []
+    for (name, _), result in zip(located, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to take screenshot of {name}, skipping. {result}")
+            continue
+        screenshots.append(result)
+
+    return screenshots
+
+
 async def take_post_screenshot(
     post,
     elements: List[
@@ -137,6 +280,7 @@ async def take_post_screenshot(
     ],
     theme: Literal["dark", "light"] = "light",
     timeout: int = 5000,
+    context: Optional[BrowserContext] = None,
 ) -> None:
     """
     Take and save a screenshot of the main post in a Reddit post/thread.
@@ -146,58 +290,66 @@ async def take_post_screenshot(
         elements: List of elements to include in the screenshot
         theme: "light" or "dark" mode
         timeout: Timeout in milliseconds. Default is 5000
+        context: Shared browser context. If None, a new browser will be launched.
     """
 
     if os.path.exists(post.image_path):
         logger.info(f"Post screenshot already exists: {post.image_path}")
         return
 
-    async with async_playwright() as p:
-        page, browser = await build_browser_context(p, theme=theme, url=post.url)
+    if context is None:
+        async with async_playwright() as p:
+            context, browser = await build_browser_context(p, theme=theme)
+            await take_post_screenshot(post, elements, theme, timeout, context)
+            await browser.close()
+        return
+
+    page = await open_page(context, post.url)
 
+    try:
         # Locate elements
-        header = page.locator('div[slot="credit-bar"]').first  # noqa: F841
-        title = page.locator('h1[slot="title"]').first  # noqa: F841
+        header = page.locator('div[slot="credit-bar"]').first
+        title = page.locator('h1[slot="title"]').first
+
+        # Wait until the post is rendered
+        try:
+            await title.wait_for(state="visible", timeout=timeout * 3)
+        except PlaywrightTimeoutError:
+            logger.warning(f"The post title is not visible after {timeout * 3} ms.")
 
+        content = None
         try:
-            content = page.locator(  # noqa: F841
+            content = page.locator(
                 'div[class="text-neutral-content"][slot="text-body"]',
             ).first
 
         except Exception as e:
             logger.warning(f"The post content is inexistent or not visible: {e}")
 
-        action_row = page.locator(  # noqa: F841
+        action_row = page.locator(
             'div[class="shreddit-post-container flex gap-sm flex-row items-center flex-nowrap justify-start h-2xl mt-md px-md xs:px-0"]',  # noqa: E501
         ).first
 
-        # Take screenshots
-        screenshots = []
-        for element in elements:
-            path = post.image_path.replace(".png", f"_{element}.png")
-            locator = eval(element)
-
-            if locator:
-                try:
-                    await locator.screenshot(path=path, timeout=timeout)
-                    screenshots.append(path)
-
-                except Exception as e:
-                    logger.warning(f"Failed to take screenshot of {element}: {e}.")
-                    continue
+        # Take screenshots concurrently and in memory, without writing part files
+        locators = {
+            "header": header,
+            "title": title,
+            "content": content,
+            "action_row": action_row,
+        }
+        screenshots = await screenshot_elements(
+            {element: locators.get(element) for element in elements},
+            timeout,
+        )
 
         if screenshots:
             # Combine the screenshots vertically
             join_images_vertically(screenshots, post.image_path)
 
-            # Remove part files
-            for path in screenshots:
-                if os.path.exists(path):
-                    os.remove(path)
-
             logger.info(f"Post screenshot saved to: {post.image_path}")
 
-        await browser.close()
+    finally:
+        await page.close()
 
 
 async def take_comment_screenshot(
@@ -209,6 +361,7 @@ async def take_comment_screenshot(
     ],  # noqa: B006
     theme: Literal["dark", "light"] = "light",
     timeout: int = 5000,
+    context: Optional[BrowserContext] = None,
 ) -> None:
     """
     Take and save a screenshot of a comment, EXCLUDING replies.
@@ -218,28 +371,45 @@ async def take_comment_screenshot(
         elements: List of elements to include in the screenshot
         theme: "light" or "dark" mode
         timeout: Timeout in milliseconds. Default is 5000
+        context: Shared browser context. If None, a new browser will be launched.
     """
 
     if os.path.exists(comment.image_path):
         logger.info(f"Comment screenshot already exists: {comment.image_path}")
         return
 
-    async with async_playwright() as p:
-        page, browser = await build_browser_context(p, theme=theme, url=comment.url)
+    if context is None:
+        async with async_playwright() as p:
+            context, browser = await build_browser_context(p, theme=theme)
+            await take_comment_screenshot(comment, elements, theme, timeout, context)
+            await browser.close()
+        return
+
+    page = await open_page(context, comment.url)
+
+    try:
 
         # Locate the target comment elements
         header = page.get_by_label(
             f"Metadata for {comment.author}'s comment",
         ).first
 
+        # Wait until the comment is rendered
+        try:
+            await header.wait_for(state="visible", timeout=timeout * 3)
+        except PlaywrightTimeoutError:
+            logger.warning(f"The comment header is not visible after {timeout * 3} ms.")
+
+        content = action_row = None
+
         # Attempt to locate the content and action row within the specified timeout
         # This is to deal with not fully displayed comments
         try:
-            content = await page.wait_for_selector(  # noqa: F841
+            content = await page.wait_for_selector(
                 'div[class="md text-14 rounded-[8px] pb-2xs overflow-hidden"][slot="comment"]',
                 timeout=timeout,
             )
-            action_row = await page.wait_for_selector(  # noqa: F841
+            action_row = await page.wait_for_selector(
                 f'shreddit-comment-action-row[slot="actionRow"][permalink="{comment.permalink}"]',
                 timeout=timeout,
             )
@@ -251,7 +421,7 @@ async def take_comment_screenshot(
 
             try:
                 # Retry locating the content and action row after expanding
-                content = await page.wait_for_selector(  # noqa: F841
+                content = await page.wait_for_selector(
                     'div[class="md text-14 rounded-[8px] pb-2xs overflow-hidden"][slot="comment"]',
                     timeout=timeout,
                 )
@@ -260,7 +430,7 @@ async def take_comment_screenshot(
                 logger.warning(f"Comment content still not visible, skipping. {e}")
 
             try:
-                action_row = await page.wait_for_selector(  # noqa: F841
+                action_row = await page.wait_for_selector(
                     f'shreddit-comment-action-row[slot="actionRow"][permalink="{comment.permalink}"]',  # noqa: E501
                     timeout=timeout,
                 )
@@ -268,21 +438,11 @@ async def take_comment_screenshot(
             except Exception as e:
                 logger.warning(f"Comment action row still not visible, skipping. {e}")
 
-        # Take screenshots
-        screenshots = []
-        for element in elements:
-            path = comment.image_path.replace(".png", f"_{element}.png")
-            locator = eval(element)
-            if locator:
-                try:
-                    await locator.screenshot(path=path)
-                    screenshots.append(path)
-
-                except Exception as e:
-                    logger.warning(
-                        f"Failed to take screenshot of {element}, skipping. {e}",
-                    )
-                    continue
+        # Take screenshots concurrently and in memory, without writing part files
+        locators = {"header": header, "content": content, "action_row": action_row}
+        screenshots = await screenshot_elements(
+            {element: locators.get(element) for element in elements},
+        )
 
         # Combine the screenshots vertically
         join_images_vertically(
@@ -290,9 +450,44 @@ async def take_comment_screenshot(
             comment.image_path,
         )
 
-        # Remove part files if they exist
-        for path in screenshots:
-            if os.path.exists(path):
-                os.remove(path)
+    finally:
+        await page.close()
+
+
+async def take_screenshots(
+    post: Optional[RedditPost],
+    comments: List[RedditComment],
+    theme: Literal["dark", "light"] = "light",
+    max_concurrency: int = 8,
+) -> None:
+    """
+    Take the post and comments screenshots concurrently. All the screenshots share a single
+    browser and logged in context, instead of launching a browser and logging in for each one.
+
+    Args:
+        post: RedditPost object. If None, only the comments are taken.
+        comments: List of RedditComment objects
+        theme: "light" or "dark" mode
+        max_concurrency: Maximum number of pages open at the same time. Default is 8
+    """
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _bounded(screenshot: Awaitable[None]) -> None:
+        async with semaphore:
+            await screenshot
+
+    async with async_playwright() as p:
+        context, browser = await build_browser_context(p, theme=theme)
+        screenshots = [
+            take_comment_screenshot(comment, theme=theme, context=context)
+            for comment in comments
+        ]
+        if post is not None:
+            screenshots.insert(
+                0,
+                take_post_screenshot(post, theme=theme, context=context),
+            )
 
+        await asyncio.gather(*(_bounded(screenshot) for screenshot in screenshots))
         await browser.close()